@@ -7,18 +7,47 @@ import boto3
 import sys
 import json
 import os
-from typing import List, Dict, Any, Optional, Union
-from botocore.exceptions import ClientError
+import codecs
+import gzip
+import io
+from typing import List, Dict, Any, Optional, Union, Iterator
+from botocore.exceptions import ClientError, EndpointConnectionError, ConnectTimeoutError
 from botocore.config import Config
-from datetime import datetime, timedelta, timezone
-from urllib.parse import urlparse
-from functools import lru_cache
+from datetime import datetime, date, timedelta, timezone
+from decimal import Decimal
+from urllib.parse import urlparse, unquote_plus
+from functools import lru_cache, wraps, partial
+from types import MappingProxyType
+from contextlib import contextmanager
 from enum import Enum
 from typing import Dict, List, Any, Optional, Union
 import re
+import math
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
+from collections import deque
 import threading
+import queue
+import tempfile
+
+try:
+    import zstandard    # Optional: only needed for .zst payloads
+except ImportError:
+    zstandard = None
+
+try:
+    import psycopg      # Optional: only needed for DB_BACKEND=postgres
+except ImportError:
+    psycopg = None
+
+try:
+    import psycopg2     # Optional: used for DB_BACKEND=postgres when psycopg 3 is not installed (python3-psycopg2 on Amazon Linux)
+    import psycopg2.extras
+except ImportError:
+    psycopg2 = None
 
 
 
@@ -37,8 +66,171 @@ REGION      = os.environ.get("REGION") #boto3.client('sts').meta.region_name
 BUCKET      = os.environ.get("BUCKET")
 KMS_KEY_ID  = os.environ.get("ANALYTICS_KMS_KEY")
 
-AWS_TYPECAST_2  =   {
-                        'timestamp'                 :   [
+UPSERT_BATCH_SIZE   = int(os.environ.get("UPSERT_BATCH_SIZE", "100"))    # Rows per INSERT ... ON CONFLICT statement
+FILE_WORKERS        = int(os.environ.get("RECEIVER_FILE_WORKERS", "4"))  # Files processed concurrently by load_data
+FILE_TRANSACTION    = os.environ.get("RECEIVER_FILE_TRANSACTION", "true").lower() == "true"  # Load each file in one transaction (its statements then run one at a time)
+LOADER_WORKERS      = int(os.environ.get("RECEIVER_LOADER_WORKERS", "32"))   # Loader tasks running at once across all files
+TABLE_WORKERS       = int(os.environ.get("RECEIVER_TABLE_WORKERS", "4"))     # Loader tasks running at once per table
+TASK_BATCH_SIZE     = int(os.environ.get("RECEIVER_TASK_BATCH_SIZE", "1000"))  # Records per loader task for list sections
+
+# How statements reach Aurora: "data-api" (default) or "postgres", direct connections for the EC2 receiver
+DB_BACKEND          = os.environ.get("DB_BACKEND", "data-api").lower()
+AURORA_ENDPOINT     = os.environ.get("AURORA_ENDPOINT")                     # Cluster writer endpoint, postgres backend only
+AURORA_PORT         = int(os.environ.get("AURORA_PORT", "5432"))
+DB_POOL_SIZE        = int(os.environ.get("DB_POOL_SIZE", str(FILE_WORKERS + LOADER_WORKERS)))  # Connections held by the postgres backend
+DB_CONNECT_TIMEOUT  = 10
+DB_PLACEHOLDER      = re.compile(r'(?<!:):([A-Za-z_][A-Za-z0-9_]*)')        # :name parameters, not ::type casts
+COPY_THRESHOLD      = int(os.environ.get("RECEIVER_COPY_THRESHOLD", "500"))  # Rows per upsert above which the postgres backend uses COPY + merge
+
+# Files larger than the threshold are parsed section by section from the S3 stream
+STREAM_THRESHOLD_BYTES  = int(os.environ.get("RECEIVER_STREAM_THRESHOLD", str(64 * 1024 * 1024)))
+STREAM_BATCH_SIZE       = int(os.environ.get("RECEIVER_STREAM_BATCH_SIZE", "1000"))   # Records per list-section batch
+STREAM_CHUNK_BYTES      = 1024 * 1024
+ARCHIVE_WORKERS         = int(os.environ.get("RECEIVER_ARCHIVE_WORKERS", "8"))        # Concurrent copies to loaded/
+ARCHIVE_DELETE_BATCH    = 1000                                                         # DeleteObjects key limit
+JSON_WHITESPACE         = re.compile(r'[ \t\n\r]*')
+PAYLOAD_VERSION         = "2"                                           # Highest spoke payload version this receiver reads
+PAYLOAD_SUFFIX          = re.compile(r'\.(nd)?json(\.(gz|zst))?$')
+LEDGER_ENABLED          = os.environ.get("RECEIVER_LEDGER", "true").lower() == "true"   # Skip unchanged files/sections
+DIMENSION_CACHE_TTL     = int(os.environ.get("RECEIVER_DIMENSION_TTL", "900"))        # Seconds before account/product ids are reloaded
+REFRESH_VIEWS           = os.environ.get("RECEIVER_REFRESH_VIEWS", "true").lower() == "true"  # Refresh materialized summary views after loading
+PARTITION_MONTHS_BACK   = int(os.environ.get("RECEIVER_PARTITION_MONTHS_BACK", "14"))  # Monthly partitions kept ready behind the current month
+PARTITION_MONTHS_AHEAD  = int(os.environ.get("RECEIVER_PARTITION_MONTHS_AHEAD", "2"))  # ...and ahead of it
+RETENTION_OVERRIDE      = os.environ.get("RECEIVER_RETENTION", "")                      # JSON {table: days kept} over RETENTION_DAYS, 0 keeps forever
+RETENTION_BATCH_SIZE    = int(os.environ.get("RECEIVER_RETENTION_BATCH_SIZE", "5000"))  # Rows per DELETE in retention mode
+RETENTION_ROLLUP        = os.environ.get("RECEIVER_RETENTION_ROLLUP", "true").lower() == "true"  # Roll expiring services up per month before pruning
+ARCHIVE_RETENTION_DAYS  = int(os.environ.get("RECEIVER_ARCHIVE_RETENTION_DAYS", "400"))  # Days loaded/ files are kept, 0 keeps them forever
+
+# Tables range-partitioned by month (sql/schema/core-schema.sql) and their partition key
+PARTITIONED_TABLES  =   {
+                            'services'                  : 'date_from',
+                            'ri_sp_daily_savings'       : 'date_to',
+                            'log_messages'              : 'created_at',
+                            'non_compliant_resources'   : 'created_at'
+                        }
+# Retention mode: the date column each pruned table expires on and the days it is kept by default.
+# log_messages is pruned before logs, whose deletes would otherwise cascade to it unbatched
+RETENTION_COLUMNS   =   {
+                            'services'                  : 'date_from',
+                            'ri_sp_daily_savings'       : 'date_to',
+                            'non_compliant_resources'   : 'created_at',
+                            'log_messages'              : 'created_at',
+                            'logs'                      : 'date_created'
+                        }
+RETENTION_DAYS      =   {
+                            'services'                  : 400,
+                            'ri_sp_daily_savings'       : 400,
+                            'non_compliant_resources'   : 400,
+                            'log_messages'              : 90,
+                            'logs'                      : 400
+                        }
+# Expiring detail summarized before it is deleted: table -> statement keeping one row per account, service and month.
+# load_service_data already keeps service_cost_monthly current, this covers months loaded before it did
+RETENTION_ROLLUPS   =   {
+                            'services'                  : """
+                                INSERT INTO service_cost_monthly (account_id, service, month, cost, currency, usage_days, line_items)
+                                SELECT account_id, service, date_trunc('month', date_from)::date, SUM(cost), MAX(currency), COUNT(DISTINCT date_from), COUNT(*)
+                                FROM services
+                                WHERE date_from < :cutoff::date
+                                GROUP BY account_id, service, date_trunc('month', date_from)
+                                ON CONFLICT (account_id, service, month) DO UPDATE SET
+                                    cost        = EXCLUDED.cost,
+                                    currency    = EXCLUDED.currency,
+                                    usage_days  = EXCLUDED.usage_days,
+                                    line_items  = EXCLUDED.line_items,
+                                    updated_at  = CURRENT_TIMESTAMP
+                            """
+                        }
+# Service cost rollups recomputed by load_service_data, only for the account's days and months it loaded.
+# Days are summed from services, months from service_cost_daily, so months survive services retention
+COST_ROLLUPS        =   {
+                            'service_cost_daily'        : """
+                                INSERT INTO service_cost_daily (account_id, service, day, cost, currency, line_items)
+                                SELECT account_id, service, date_from, SUM(cost), MAX(currency), COUNT(*)
+                                FROM services
+                                WHERE account_id = :account_id AND date_from = ANY(:days::date[])
+                                GROUP BY account_id, service, date_from
+                                ON CONFLICT (account_id, service, day) DO UPDATE SET
+                                    cost        = EXCLUDED.cost,
+                                    currency    = EXCLUDED.currency,
+                                    line_items  = EXCLUDED.line_items,
+                                    updated_at  = CURRENT_TIMESTAMP
+                            """,
+                            'service_cost_monthly'      : """
+                                INSERT INTO service_cost_monthly (account_id, service, month, cost, currency, usage_days, line_items)
+                                SELECT account_id, service, date_trunc('month', day)::date, SUM(cost), MAX(currency), COUNT(*), SUM(line_items)
+                                FROM service_cost_daily
+                                WHERE account_id = :account_id AND day >= :month_from::date AND day < :month_to::date
+                                GROUP BY account_id, service, date_trunc('month', day)
+                                ON CONFLICT (account_id, service, month) DO UPDATE SET
+                                    cost        = EXCLUDED.cost,
+                                    currency    = EXCLUDED.currency,
+                                    usage_days  = EXCLUDED.usage_days,
+                                    line_items  = EXCLUDED.line_items,
+                                    updated_at  = CURRENT_TIMESTAMP
+                            """
+                        }
+# Taken before the rollups are recomputed and held until commit, so the transactions of one account recompute
+# them one after another, each seeing the daily rows the previous one committed
+COST_ROLLUP_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('service_cost_monthly'), :account_id::int)"
+PARTITIONS_SQL      =   """
+                            SELECT parent.relname AS parent_name, child.relname AS partition_name
+                            FROM pg_class parent
+                            JOIN pg_namespace ns ON ns.oid = parent.relnamespace AND ns.nspname = current_schema()
+                            LEFT JOIN pg_inherits inh ON inh.inhparent = parent.oid
+                            LEFT JOIN pg_class child ON child.oid = inh.inhrelid
+                            WHERE parent.relkind = 'p'
+                        """
+
+# Materialized summary views (sql/schema/core-view.sql) and the tables they read; refreshed when a load run wrote to any of them
+MATERIALIZED_VIEWS  =   {
+                            'mv_summary'                        : {'accounts', 'cost_reports', 'service_cost_monthly', 'security', 'product_accounts'},
+                            'mv_acct_summary'                   : {'accounts', 'product_accounts', 'products', 'cost_reports', 'security', 'inventory_instances'},
+                            'mv_product_summary'                : {'accounts', 'product_accounts', 'products', 'cost_reports', 'service_cost_monthly', 'security'},
+                            'mv_acct_security_findings_summary' : {'accounts', 'product_accounts', 'products', 'security'}
+                        }
+# One statement so the transaction-scoped lock is released with it; a refresh already running elsewhere is skipped, not queued
+REFRESH_VIEW_SQL    =   """
+DO $$
+BEGIN
+    IF NOT pg_try_advisory_xact_lock('{view}'::regclass::oid::bigint) THEN
+        RAISE EXCEPTION 'refresh of {view} already running';
+    END IF;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY {view};
+END
+$$
+"""
+
+# RDS Data API BatchExecuteStatement limits
+DATA_API_MAX_PARAMETER_SETS = int(os.environ.get("BATCH_MAX_PARAMETER_SETS", "1000"))
+DATA_API_MAX_PAYLOAD_BYTES  = int(os.environ.get("BATCH_MAX_PAYLOAD_BYTES", str(1024 * 1024)))
+DATA_API_MAX_RETRIES        = 3
+DATA_API_MAX_SQL_CHARS      = 65536                                     # ExecuteStatement sql length limit
+DATA_API_TRANSIENT_ERRORS   = {
+                                'ThrottlingException',
+                                'ServiceUnavailableError',
+                                'InternalServerErrorException',
+                                'DatabaseResumingException',
+                                'DatabaseUnavailableException'
+                            }
+# Dropped or refused connections of the postgres backend; the pool opens a new connection on retry
+POSTGRES_TRANSIENT_ERRORS   = tuple(driver.OperationalError for driver in (psycopg, psycopg2) if driver is not None)
+
+# Unique (non-partial, non-expression) indexes per table, used as ON CONFLICT targets by bulk_upsert
+UNIQUE_INDEX_SQL    = """
+                        SELECT t.relname, string_agg(a.attname, ',' ORDER BY a.attname)
+                        FROM pg_index i
+                        JOIN pg_class t ON t.oid = i.indrelid
+                        JOIN pg_namespace n ON n.oid = t.relnamespace
+                        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = ANY(i.indkey)
+                        WHERE i.indisunique AND i.indpred IS NULL AND i.indexprs IS NULL
+                        AND n.nspname = current_schema()
+                        GROUP BY t.relname, i.indexrelid
+                    """
+
+# PostgreSQL cast per column name, used when a table's own column types are unknown
+TYPE_CASTING    =   {
+                        'timestamp with time zone'  :   [
                                                             'created_at',
                                                             'updated_at',
                                                             'joined_timestamp',
@@ -73,7 +265,7 @@ AWS_TYPECAST_2  =   {
                         'period_granularity_type'   :   [
                                                             'period_granularity'
                                                         ],
-                        'varchar_array'             :   [
+                        'varchar[]'                 :   [
                                                             
                                                         ],
                         'numeric'                   :   [
@@ -103,12 +295,55 @@ AWS_TYPECAST_2  =   {
                                                         ],
                     }
 
-TYPE_CASTING    =   {
-                        'timestamp with time zone'  : AWS_TYPECAST_2['timestamp'],
-                        'period_granularity_type'   : AWS_TYPECAST_2['period_granularity_type'],
-                        'varchar[]'                 : AWS_TYPECAST_2['varchar_array'],
-                        'numeric'                   : AWS_TYPECAST_2['numeric']
+# Frozen column -> cast index built from TYPE_CASTING once at import
+COLUMN_TYPES    = MappingProxyType({col: pg_type for pg_type, cols in TYPE_CASTING.items() for col in cols})
+
+# Column types per table, so casts follow the real schema (e.g. date_from is DATE on config_reports)
+COLUMN_TYPES_SQL    = """
+                        SELECT table_name, column_name, data_type, udt_name
+                        FROM information_schema.columns
+                        WHERE table_schema = current_schema()
+                    """
+CHARACTER_TYPES     = {'character varying', 'character', 'text'}   # Bound as strings already, never cast
+
+# Tables with this column store a hash of each row's values; unchanged rows are skipped instead of rewritten
+FINGERPRINT_COLUMN  = 'row_fingerprint'
+FINGERPRINT_EXCLUDED = {'id', 'created_at', 'updated_at', FINGERPRINT_COLUMN}
+
+SQL_IDENTIFIER      = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+SELECT_PAGE_SIZE    = int(os.environ.get("RECEIVER_SELECT_PAGE_SIZE", "5000"))   # Rows per page read by DBManager.iter_select
+
+# Fractional seconds come with as many digits as they need; datetime.fromisoformat before Python 3.11 only accepts 3 or 6
+TIMESTAMP_FRACTION  = re.compile(r'\.(\d{1,6})\d*')
+# Python value per PostgreSQL type of a result column (typeName of the Data API columnMetadata); other types are kept as returned
+RESULT_TYPES    =   {
+                        'numeric'       : Decimal,
+                        'timestamp'     : lambda value: datetime.fromisoformat(TIMESTAMP_FRACTION.sub(lambda fraction: f".{fraction[1]:0<6}", value)),
+                        'timestamptz'   : lambda value: datetime.fromisoformat(TIMESTAMP_FRACTION.sub(lambda fraction: f".{fraction[1]:0<6}", value if value[-6] in '+-' else value + '+00:00')),    # Data API returns UTC without offset
+                        'date'          : date.fromisoformat,
+                        'json'          : json.loads,
+                        'jsonb'         : json.loads,
+                        'array'         : lambda value: json.loads(value) if isinstance(value, str) else next(iter(value.values()), [])
+                    }
+
+# Type names of the postgres backend's result columns by OID, matching the Data API typeName
+PG_TYPE_NAMES   =   {
+                        16: 'bool', 20: 'int8', 21: 'int2', 23: 'int4', 25: 'text', 114: 'json', 700: 'float4', 701: 'float8',
+                        1043: 'varchar', 1082: 'date', 1114: 'timestamp', 1184: 'timestamptz', 1700: 'numeric', 3802: 'jsonb',
+                        1007: '_int4', 1009: '_text', 1015: '_varchar'
                     }
+STATEMENT_CACHE_SIZE = 2048                                             # SQL templates kept before the cache is reset
+
+# Loaded once per cold start and shared by every DBManager instance
+_UNIQUE_INDEXES: Optional[Dict[str, List[frozenset]]] = None
+_UNIQUE_INDEXES_LOCK = threading.Lock()
+_TABLE_COLUMN_TYPES: Optional[Dict[str, Dict[str, Optional[str]]]] = None
+_TABLE_COLUMN_TYPES_LOCK = threading.Lock()
+
+# Generated SQL per statement shape (kind, table, columns, keys, ...), shared by every DBManager instance
+_STATEMENT_CACHE: Dict[tuple, Dict[str, Any]] = {}
+_STATEMENT_CACHE_LOCK = threading.Lock()
+STATEMENT_CACHE_STATS = {'hits': 0, 'misses': 0, 'build_time': 0.0}
 
 ###START: HELPER CLASSES###
 
@@ -251,22 +486,109 @@ class S3Manager:
         self.s3 = boto3.client('s3')
     
     def list_files(self, prefix: str = '') -> List[Dict[str, str]]:
-        """Lightning-fast file listing"""
+        """Lightning-fast file listing, every page, oldest file first"""
         try:
-            response = self.s3.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
-            return [
-                {'file_name': obj['Key'].split('/')[-1], 'file_path': obj['Key']}
-                for obj in response.get('Contents', [])
-            ]
+            return list(self.iter_files(prefix))
         except Exception:
             return []
+
+    def _list_level(self, prefix: str, delimiter: str = '') -> Iterator[Dict[str, str]]:
+        """Objects under prefix following continuation tokens; with a delimiter,
+        sub-prefixes are yielded as {'prefix': ...} next to the objects at this level"""
+        params = {'Bucket': self.bucket, 'Prefix': prefix}
+        if delimiter:
+            params['Delimiter'] = delimiter
+
+        for page in self.s3.get_paginator('list_objects_v2').paginate(**params):
+            for common in page.get('CommonPrefixes', []):
+                yield {'prefix': common['Prefix']}
+            yield from self._page_files(page)
+
+    @staticmethod
+    def _page_files(page: Dict) -> Iterator[Dict[str, str]]:
+        for obj in page.get('Contents', []):
+            if not obj['Key'].endswith('/'):
+                yield {'file_name': obj['Key'].split('/')[-1], 'file_path': obj['Key']}
+
+    def shard_prefixes(self, prefix: str = 'data/', depth: int = 2) -> tuple:
+        """data/{account}/{region}/ shards below prefix, plus any files found above that depth"""
+        shards, loose = [prefix], []
+        for _ in range(depth):
+            children = []
+            for shard in shards:
+                for item in self._list_level(shard, delimiter='/'):
+                    if 'prefix' in item:
+                        children.append(item['prefix'])
+                    else:
+                        loose.append(item)
+            shards = children
+        return shards, loose
+
+    def iter_files(self, prefix: str = 'data/', oldest_first: bool = True) -> Iterator[Dict[str, str]]:
+        """Lazily yield every file below prefix. A prefix whose files fit in one listing page is served
+        by that single request; a larger one gets one paginated listing per account/region shard.
+        Keys start with the date, so each shard lists oldest first and heapq.merge keeps that order
+        across shards while only holding one page per shard."""
+        first = self.s3.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
+        if not first.get('IsTruncated'):
+            files = self._page_files(first)
+            yield from sorted(files, key=lambda f: (f['file_name'], f['file_path'])) if oldest_first else files
+            return
+
+        shards, loose = self.shard_prefixes(prefix)
+        streams = [iter(sorted(loose, key=lambda f: f['file_name']))] + [self._list_level(shard) for shard in shards]
+
+        if oldest_first:
+            yield from heapq.merge(*streams, key=lambda f: (f['file_name'], f['file_path']))
+        else:
+            for stream in streams:
+                yield from stream
     
     def read_file(self, file_path: str) -> str:
-        """Optimized file reading"""
+        """Optimized file reading, decompressed according to the payload format"""
         try:
-            return self.s3.get_object(Bucket=self.bucket, Key=file_path)['Body'].read().decode('utf-8')
+            return self.open_payload(file_path)[1].read().decode('utf-8')
         except Exception:
             return ""
+
+    def open_file(self, file_path: str) -> Dict[str, Any]:
+        """get_object response with the unread Body stream, errors are raised to the caller"""
+        return self.s3.get_object(Bucket=self.bucket, Key=file_path)
+
+    @staticmethod
+    def payload_format(file_path: str, metadata: Dict[str, str]) -> tuple:
+        """(layout, encoding) of a spoke file from its S3 metadata, else from the key suffix.
+        Legacy files (pretty-printed .json, no metadata) read as ('json', 'identity')."""
+        version = metadata.get('payload-version')
+        if version and int(version) > int(PAYLOAD_VERSION):
+            raise ValueError(f"Unsupported payload version {version} for {file_path}")
+
+        layout      = metadata.get('payload-format')
+        encoding    = metadata.get('payload-encoding')
+        if not layout:
+            name        = file_path.lower()
+            layout      = 'ndjson' if '.ndjson' in name else 'json'
+            encoding    = 'gzip' if name.endswith('.gz') else 'zstd' if name.endswith('.zst') else 'identity'
+        return layout, encoding or 'identity'
+
+    def open_payload(self, file_path: str) -> tuple:
+        """(layout, decompressed stream, uncompressed size, get_object response) for a spoke file"""
+        response            = self.open_file(file_path)
+        metadata            = response.get('Metadata', {})
+        layout, encoding    = self.payload_format(file_path, metadata)
+
+        body = response['Body']
+        if encoding == 'gzip':
+            body = gzip.GzipFile(fileobj=body, mode='rb')
+        elif encoding == 'zstd':
+            if zstandard is None:
+                raise ValueError(f"zstandard is not installed, cannot read {file_path}")
+            body = zstandard.ZstdDecompressor().stream_reader(body)
+        elif encoding != 'identity':
+            raise ValueError(f"Unsupported payload encoding {encoding} for {file_path}")
+
+        size = int(metadata.get('payload-bytes') or response.get('ContentLength', 0))
+        return layout, body, size, response
     
     def move_to_processed(self, file_path) -> bool:
         try:
@@ -291,6 +613,38 @@ class S3Manager:
             #print(f"{ERROR} Failed to move {file_path}: {e}")
             return False
 
+    def delete_older_than(self, prefix: str, cutoff: datetime) -> Dict[str, int]:
+        """Delete the objects below prefix last modified before cutoff, up to 1000 keys per DeleteObjects request"""
+        stats = {'deleted': 0, 'bytes': 0, 'failed': 0}
+
+        def delete(batch: List[Dict]):
+            try:
+                response    = self.s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': obj['Key']} for obj in batch], 'Quiet': True}
+                )
+                failed      = {error.get('Key') for error in response.get('Errors', [])}
+            except Exception as e:
+                print(f"{ERROR} Failed to delete {len(batch)} file(s) from {prefix}: {e}")
+                failed      = {obj['Key'] for obj in batch}
+            stats['failed'] += len(failed)
+            for obj in batch:
+                if obj['Key'] not in failed:
+                    stats['deleted']    += 1
+                    stats['bytes']      += obj.get('Size', 0)
+
+        batch = []
+        for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['LastModified'] < cutoff:
+                    batch.append(obj)
+                if len(batch) >= ARCHIVE_DELETE_BATCH:
+                    delete(batch)
+                    batch = []
+        if batch:
+            delete(batch)
+        return stats
+
     def delete_files(self, file_path) -> bool:
         try:
             return self.move_to_processed(file_path)
@@ -298,51 +652,387 @@ class S3Manager:
             print(f"{ERROR} Failed to delete {file_path}: {e}")
             return False
 
-""" 3. DB MANAGER : Wrapper class that manages the database interactions. Insert, Update, Select Queries """
-class DBManager:
-    __slots__ = ('database', 'client', 'cluster_arn', 'secret_arn', '_base_params')
-    
-    def __init__(self, database_name: str, cluster_arn: Optional[str] = None, secret_arn: Optional[str] = None):
-        self.database       = database_name
-        self.client         = boto3.client('rds-data', region_name=REGION)
-        self.cluster_arn    = cluster_arn or os.environ['AURORA_CLUSTER_ARN']
-        self.secret_arn     = secret_arn or os.environ['AURORA_SECRET_ARN']
-        
-        # Pre-compute base parameters
-        self._base_params: Dict[str, Any] = {
-            'resourceArn'   : self.cluster_arn,
-            'secretArn'     : self.secret_arn,
-            'database'      : self.database
-        }
+""" 2a. S3 ARCHIVER : Moves processed files to loaded/ in the background, off the loading path """
+class S3Archiver:
+    """Queues processed keys, copies them to loaded/ concurrently and deletes the originals
+    with DeleteObjects in batches of up to 1000. flush() must run before the handler returns."""
+    __slots__ = ('s3', 'executor', 'futures', 'pending', 'lock', 'stats', 'started')
+
+    def __init__(self, s3_manager: S3Manager, workers: int = ARCHIVE_WORKERS):
+        self.s3         = s3_manager
+        self.executor   = ThreadPoolExecutor(max_workers=workers)
+        self.futures    = []
+        self.pending    = []
+        self.lock       = threading.Lock()
+        self.stats      = {'ARCHIVED': 0, 'ARCHIVE_FAILED': 0}
+        self.started    = None
+
+    def submit(self, file_path: str):
+        """Queue a loaded file for archiving"""
+        with self.lock:
+            self.started = self.started or time.time()
+            self.futures.append(self.executor.submit(self._copy, file_path))
+
+    def _copy(self, file_path: str):
+        try:
+            self.s3.s3.copy_object(
+                Bucket=self.s3.bucket,
+                CopySource={'Bucket': self.s3.bucket, 'Key': file_path},
+                Key=file_path.replace('data/', 'loaded/', 1)
+            )
+        except Exception as e:
+            # The original stays in data/ and is loaded again on the next run
+            print(f"{ERROR} Failed to archive {file_path}: {e}")
+            with self.lock:
+                self.stats['ARCHIVE_FAILED'] += 1
+            return
+
+        batch = None
+        with self.lock:
+            self.pending.append(file_path)
+            if len(self.pending) >= ARCHIVE_DELETE_BATCH:
+                batch, self.pending = self.pending, []
+        if batch:
+            self._delete(batch)
+
+    def _delete(self, keys: List[str]):
+        """Remove archived originals with one DeleteObjects request"""
+        try:
+            response    = self.s3.s3.delete_objects(
+                Bucket=self.s3.bucket,
+                Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+            )
+            errors      = response.get('Errors', [])
+            for error in errors:
+                print(f"{ERROR} Failed to delete {error.get('Key')}: {error.get('Message')}")
+        except Exception as e:
+            print(f"{ERROR} Failed to delete {len(keys)} archived file(s): {e}")
+            errors = keys
+        with self.lock:
+            self.stats['ARCHIVED']          += len(keys) - len(errors)
+            self.stats['ARCHIVE_FAILED']    += len(errors)
+
+    def flush(self) -> Dict:
+        """Wait for queued copies, delete the last batch and return the archive stats"""
+        wait(list(self.futures))
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            self._delete(batch)
+        self.executor.shutdown(wait=True)
+
+        stats = dict(self.stats)
+        stats['archive_time_finish'] = round(time.time() - self.started, 2) if self.started else 0
+        return stats
+
+""" 2b. JSON SECTION STREAM : Parses the top-level sections of a spoke file incrementally from a byte stream """
+class JSONSectionStream:
+    """Iterates (section, value) over a top-level JSON object without reading it whole.
+    List sections are yielded in batches of at most batch_size records, other sections whole."""
+    __slots__ = ('body', 'batch_size', 'chunk_size', 'decoder', 'utf8', 'buf', 'pos', 'eof')
+
+    def __init__(self, body: Any, batch_size: int = STREAM_BATCH_SIZE, chunk_size: int = STREAM_CHUNK_BYTES):
+        self.body       = body
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.decoder    = json.JSONDecoder()
+        self.utf8       = codecs.getincrementaldecoder('utf-8')()
+        self.buf        = ''
+        self.pos        = 0
+        self.eof        = False
+
+    def _read(self) -> bool:
+        """Append the next chunk to the buffer, False at end of stream"""
+        if self.eof:
+            return False
+        chunk = self.body.read(self.chunk_size)
+        if not chunk:
+            self.eof    = True
+            self.buf   += self.utf8.decode(b'', final=True)
+            return False
+        # Drop what has been consumed so the buffer stays about one value in size
+        if self.pos > len(self.buf) // 2:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        self.buf += self.utf8.decode(chunk)
+        return True
 
-    def _format_parameters(self, params: Dict[str, Any]) -> List[Dict]:
-        """Ultra-fast parameter formatting"""
-        return [
-            {'name': k, 'value': self._get_value_dict(v)}
-            for k, v in params.items()
-        ]
-    
-    def _get_postgres_type(self, field_name: str, type_map: Dict) -> Optional[str]:
-        """Get PostgreSQL type for field"""
-        for pg_type, fields in type_map.items():
-            if field_name in fields:
-                # Return the actual PostgreSQL type name
-                if pg_type == 'varchar_array':
-                    return 'varchar[]'  # Convert to proper PostgreSQL syntax
-                elif pg_type == 'timestamp':
-                    return 'timestamp'  # Convert to proper PostgreSQL syntax
+    def _peek(self) -> str:
+        """Next non-whitespace character, '' at end of stream"""
+        while True:
+            self.pos = JSON_WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read():
+                return ''
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON stream")
+        self.pos += 1
+
+    def _decode(self) -> Any:
+        """Decode one complete JSON value at the cursor, reading more of the stream as needed"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Grow geometrically so a large value is not re-parsed once per chunk
+                needed = 2 * (len(self.buf) - self.pos)
+                while len(self.buf) - self.pos < needed and self._read():
+                    pass
+                continue
+            # A number cut at the buffer end ("12" of "123", "0" of "0.5") continues in the next chunk
+            if (end < len(self.buf) and self.buf[end] not in '.eE+-0123456789') or not self._read():
+                self.pos = end
+                return value
+
+    def __iter__(self):
+        if self._peek() == '"':
+            # Double-encoded file (a JSON string holding the object) cannot be streamed
+            data = json.loads(self._decode())
+            for section, value in data.items():
+                if isinstance(value, list):
+                    for start in range(0, max(len(value), 1), self.batch_size):
+                        yield section, value[start:start + self.batch_size]
                 else:
-                    return pg_type
-        return None
+                    yield section, value
+            return
+
+        self._expect('{')
+        while self._peek() != '}':
+            if self._peek() == ',':
+                self.pos += 1
+            section = self._decode()
+            self._expect(':')
+
+            if self._peek() != '[':
+                yield section, self._decode()
+                continue
+
+            self.pos   += 1
+            batch       = []
+            yielded     = False
+            while self._peek() != ']':
+                if self._peek() == ',':
+                    self.pos += 1
+                    continue
+                batch.append(self._decode())
+                if len(batch) >= self.batch_size:
+                    yield section, batch
+                    batch, yielded = [], True
+            self.pos += 1
+            if batch or not yielded:
+                yield section, batch
+        self.pos += 1
+
+class NDJSONSectionStream:
+    """Iterates (section, value) over an NDJSON payload: a manifest line with the record count per section,
+    then one line per list record or per other section. Records are batched like JSONSectionStream and the
+    counts are checked against the manifest once the last line was read, after the earlier batches were
+    yielded: a truncated file raises, and only a file transaction rolls back what it loaded. Without one,
+    use verified(), which checks the counts before the first section is yielded."""
+    __slots__ = ('lines', 'batch_size')
+
+    def __init__(self, body: Any, batch_size: int = STREAM_BATCH_SIZE):
+        self.lines      = io.TextIOWrapper(body, encoding='utf-8')
+        self.batch_size = batch_size
+
+    @classmethod
+    def verified(cls, body: Any, batch_size: int = STREAM_BATCH_SIZE) -> 'NDJSONSectionStream':
+        """Stream over a temporary local copy of body, made while its record counts are checked against
+        the manifest, so a truncated file raises before anything is loaded"""
+        lines       = io.TextIOWrapper(body, encoding='utf-8')
+        spool       = tempfile.TemporaryFile()
+        header      = lines.readline()
+        manifest    = cls._manifest(header)
+        counts      = dict.fromkeys(manifest, 0)
+        spool.write(header.encode('utf-8'))
+        for line in lines:
+            spool.write(line.encode('utf-8'))
+            if line.strip():
+                section         = json.loads(line)['section']
+                counts[section] = counts.get(section, 0) + 1
+        try:
+            cls._check(counts, manifest)
+        except ValueError:
+            spool.close()
+            raise
+        spool.seek(0)
+        return cls(spool, batch_size)
 
+    @staticmethod
+    def _manifest(line: str) -> Dict[str, int]:
+        manifest = json.loads(line or '{}').get('sections')
+        if not isinstance(manifest, dict):
+            raise ValueError("NDJSON payload has no manifest")
+        return manifest
 
     @staticmethod
-    def _validate_sql_identifier(identifier: str) -> bool:
-        """Validate SQL identifier to prevent injection"""
-        return bool(re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', identifier))
-    
+    def _check(counts: Dict[str, int], manifest: Dict[str, int]):
+        if counts != manifest:
+            raise ValueError(f"NDJSON payload does not match its manifest: {counts} != {manifest}")
+
+    def __iter__(self):
+        manifest    = self._manifest(self.lines.readline())
+        counts      = dict.fromkeys(manifest, 0)
+        section     = None
+        batch       = []
+        for line in self.lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item['section'] != section or len(batch) >= self.batch_size:
+                if batch:
+                    yield section, batch
+                section, batch = item['section'], []
+            counts[section] = counts.get(section, 0) + 1
+            if 'record' in item:
+                batch.append(item['record'])
+            else:
+                yield section, item.get('value')
+        if batch:
+            yield section, batch
+
+        self._check(counts, manifest)
+
+        # Empty list sections have no lines, but count as present for the structure check
+        for name, count in manifest.items():
+            if count == 0:
+                yield name, []
+
+""" 2c. LOAD STATS : Per-thread load counters, merged when a file's summary is read """
+# Table and section the current thread is loading, attributed to every statement it sends
+_LOAD_CONTEXT = threading.local()
+
+# Statement latencies are counted in buckets whose bounds grow by 10% from 0.1 ms, so p50/p95 stay within
+# 10% of the exact value while a table's stats hold at most a few hundred counters however long the run
+LATENCY_BUCKET_FLOOR    = 0.0001
+LATENCY_BUCKET_GROWTH   = 1.1
+
+@contextmanager
+def load_context(**context):
+    """Set table= and/or section= for the statements sent inside the block"""
+    previous = {key: getattr(_LOAD_CONTEXT, key, None) for key in context}
+    for key, value in context.items():
+        setattr(_LOAD_CONTEXT, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(_LOAD_CONTEXT, key, value)
+
+class LoadStats:
+    """Load counters of one file. Every thread only writes its own shard, shards are merged by summary(),
+    so concurrent loaders never lose an increment. A shard's lock is only contended while summary() merges it,
+    so a summary read mid-load never iterates a shard that is being written. Besides the CREATED/UPDATED/SKIPPED totals it keeps
+    rows, statements, bytes and a statement latency histogram per table and per section."""
+    __slots__ = ('local', 'shards', 'lock')
+
+    def __init__(self):
+        self.local  = threading.local()
+        self.shards = []
+        self.lock   = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {'totals': {}, 'tables': {}, 'sections': {}, 'lock': threading.Lock()}
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    @staticmethod
+    def _group(groups: Dict, name: str) -> Dict:
+        group = groups.get(name)
+        if group is None:
+            group = groups[name] = {'rows': 0, 'skipped': 0, 'statements': 0, 'bytes': 0, 'time': 0.0, 'latencies': {}}
+        return group
+
+    def add(self, key: str, value: int = 1):
+        shard = self._shard()
+        with shard['lock']:
+            shard['totals'][key] = shard['totals'].get(key, 0) + value
+
+    def rows(self, table: str, written: int, skipped: int):
+        """Rows written (created or updated) and skipped by one upsert into table"""
+        shard = self._shard()
+        with shard['lock']:
+            for groups, name in ((shard['tables'], table), (shard['sections'], getattr(_LOAD_CONTEXT, 'section', None))):
+                if name:
+                    group             = self._group(groups, name)
+                    group['rows']    += written
+                    group['skipped'] += skipped
+
+    def statement(self, size: int, seconds: float):
+        """One Data API request of about size bytes, attributed to the current table and section"""
+        shard = self._shard()
+        with shard['lock']:
+            for groups, name in ((shard['tables'], getattr(_LOAD_CONTEXT, 'table', None) or 'other'),
+                                 (shard['sections'], getattr(_LOAD_CONTEXT, 'section', None) or 'file')):
+                group                = self._group(groups, name)
+                group['statements'] += 1
+                group['bytes']      += size
+                group['time']       += seconds
+                bucket                      = latency_bucket(seconds)
+                group['latencies'][bucket]  = group['latencies'].get(bucket, 0) + 1
+
+    def __getitem__(self, key: str) -> int:
+        return self.summary().get(key, 0)
+
+    def summary(self) -> Dict:
+        """Merged totals plus 'tables' and 'sections' breakdowns, in the shape merge_stats adds up"""
+        result = {'CREATED': 0, 'UPDATED': 0, 'SKIPPED': 0, 'TOTAL': 0, 'LOADED': 0, 'tables': {}, 'sections': {}}
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            with shard['lock']:
+                merge_stats(result, {**shard['totals'], 'tables': shard['tables'], 'sections': shard['sections']})
+        return result
+
+def table_context(method):
+    """Attribute the statements sent by method(self, table, ...) to table"""
+    @wraps(method)
+    def wrapper(self, table: str, *args, **kwargs):
+        with load_context(table=table):
+            return method(self, table, *args, **kwargs)
+    return wrapper
+
+def latency_bucket(seconds: float) -> int:
+    """Histogram bucket of one statement latency: the smallest n with seconds <= floor * growth ** n"""
+    if seconds <= LATENCY_BUCKET_FLOOR:
+        return 0
+    return math.ceil(math.log(seconds / LATENCY_BUCKET_FLOOR, LATENCY_BUCKET_GROWTH))
+
+def latency_percentile(latencies: Dict[int, int], percentile: float) -> float:
+    """Nearest-rank percentile of a latency histogram, as the upper bound of its bucket in seconds"""
+    total = sum(latencies.values())
+    if not total:
+        return 0.0
+    rank, seen = max(1, math.ceil(percentile / 100 * total)), 0
+    for bucket in sorted(latencies):
+        seen += latencies[bucket]
+        if seen >= rank:
+            return LATENCY_BUCKET_FLOOR * LATENCY_BUCKET_GROWTH ** bucket
+    return 0.0
+
+""" 2d. DB BACKENDS : How DBManager statements reach Aurora. Both return Data API shaped responses """
+class DataAPIBackend:
+    """RDS Data API over HTTPS, the only option for the Lambda receiver"""
+    __slots__ = ('client', 'base_params')
+
+    def __init__(self, client: Any, cluster_arn: str, secret_arn: str, database: str):
+        self.client         = client    # boto3 clients are thread-safe and can be shared
+        self.base_params    = {
+            'resourceArn'   : cluster_arn,
+            'secretArn'     : secret_arn,
+            'database'      : database
+        }
+
     @staticmethod
-    def _get_value_dict(value: Any) -> Dict:
+    def value_dict(value: Any) -> Dict:
         """Optimized value type detection with JSON support"""
         if value is None:
             return {'isNull': True}
@@ -359,52 +1049,444 @@ class DBManager:
         else:
             return {'stringValue': str(value)}
 
-    @lru_cache(maxsize=128)
-    def _extract_columns(self, query: str) -> tuple:
-        """Cached column extraction with regex"""
-        match = re.search(r'select\s+(.*?)\s+from', query.lower())
-        if not match:
-            return ()
-        
-        cols = [col.strip() for col in match.group(1).split(',')]
+    @classmethod
+    def format_parameters(cls, params: Dict[str, Any]) -> List[Dict]:
+        """Ultra-fast parameter formatting"""
+        return [
+            {'name': k, 'value': cls.value_dict(v)}
+            for k, v in params.items()
+        ]
+
+    def _params(self, transaction: Optional[str], **params) -> Dict:
+        if transaction is not None:
+            params['transactionId'] = transaction
+        return {**self.base_params, **params}
+
+    def execute(self, sql: str, params: Optional[Dict] = None, transaction: Optional[str] = None, metadata: bool = False,
+                long_running: bool = False) -> Dict:
+        request = self._params(transaction, sql=sql)
+        if params:
+            request['parameters'] = self.format_parameters(params)
+        if metadata:
+            request['includeResultMetadata'] = True
+        if long_running:
+            # The call still times out after 45s, but the statement keeps running to completion
+            request['continueAfterTimeout'] = True
+        return self.client.execute_statement(**request)
+
+    def execute_batch(self, sql: str, parameter_sets: List[Dict], transaction: Optional[str] = None) -> Dict:
+        parameter_sets = [self.format_parameters(params) for params in parameter_sets]
+        return self.client.batch_execute_statement(**self._params(transaction, sql=sql, parameterSets=parameter_sets))
+
+    def begin(self) -> str:
+        return self.client.begin_transaction(**self.base_params)['transactionId']
+
+    def commit(self, transaction: str):
+        self.client.commit_transaction(resourceArn=self.base_params['resourceArn'], secretArn=self.base_params['secretArn'], transactionId=transaction)
+
+    def rollback(self, transaction: str):
+        self.client.rollback_transaction(resourceArn=self.base_params['resourceArn'], secretArn=self.base_params['secretArn'], transactionId=transaction)
+
+
+class PostgresBackend:
+    """Direct connections to the cluster writer for the EC2 receiver, which runs inside the VPC.
+    Connections are pooled and autocommit; psycopg 3 prepares repeated statements server side and
+    pipelines executemany, psycopg2 sends batches as pages of statements. A transaction is one
+    connection taken out of the pool until commit or rollback."""
+    __slots__ = ('endpoint', 'port', 'database', 'secret_arn', 'secrets', 'credentials', 'pool', 'slots', 'lock')
+
+    def __init__(self, endpoint: str, port: int, database: str, secret_arn: str, pool_size: int = DB_POOL_SIZE,
+                 secrets_client: Optional[Any] = None):
+        self.endpoint       = endpoint
+        self.port           = port
+        self.database       = database
+        self.secret_arn     = secret_arn
+        self.secrets        = secrets_client or boto3.client('secretsmanager', region_name=REGION)
+        self.credentials: Optional[tuple]   = None
+        self.pool                           = queue.LifoQueue()     # Most recently used first, so idle extras stay idle
+        self.slots                          = threading.BoundedSemaphore(pool_size)
+        self.lock                           = threading.Lock()
+
+    def _credentials(self, refresh: bool = False) -> tuple:
+        """Username and password from the cluster secret, read again after a rotation"""
+        with self.lock:
+            if self.credentials is None or refresh:
+                secret              = json.loads(self.secrets.get_secret_value(SecretId=self.secret_arn)['SecretString'])
+                self.credentials    = (secret['username'], secret['password'])
+            return self.credentials
+
+    def _open(self, user: str, password: str) -> Any:
+        options = dict(host=self.endpoint, port=self.port, dbname=self.database, user=user, password=password,
+                       sslmode='require', connect_timeout=DB_CONNECT_TIMEOUT, application_name='a360-receiver')
+        if psycopg is not None:
+            return psycopg.connect(**options, autocommit=True)
+        connection              = psycopg2.connect(**options)
+        connection.autocommit   = True
+        return connection
+
+    def _connect(self) -> Any:
+        try:
+            return self._open(*self._credentials())
+        except POSTGRES_TRANSIENT_ERRORS as e:
+            if 'authentication' not in str(e):
+                raise
+            return self._open(*self._credentials(refresh=True))
+
+    def _acquire(self) -> Any:
+        self.slots.acquire()
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _release(self, connection: Any):
+        """Return a connection to the pool, or drop it if it broke or was left inside a transaction"""
+        try:
+            if connection.closed or getattr(connection, 'broken', False) or self._in_transaction(connection):
+                connection.close()
+            else:
+                self.pool.put(connection)
+        finally:
+            self.slots.release()
+
+    @staticmethod
+    def _in_transaction(connection: Any) -> bool:
+        if psycopg is not None:
+            return connection.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+        return connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    @contextmanager
+    def connection(self, transaction: Optional[Any] = None):
+        """The transaction's connection, else one borrowed from the pool"""
+        if transaction is not None:
+            yield transaction
+            return
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            self._release(connection)
+
+    @staticmethod
+    @lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+    def convert(sql: str) -> str:
+        """Data API :name parameters to pyformat %(name)s, keeping ::type casts"""
+        return DB_PLACEHOLDER.sub(r'%(\1)s', sql.replace('%', '%%'))
+
+    @staticmethod
+    def adapt(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Bind values the way the Data API does: JSON documents as text, cast in the SQL"""
+        return {key: json.dumps(value) if isinstance(value, (dict, list)) else value for key, value in params.items()}
+
+    def execute(self, sql: str, params: Optional[Dict] = None, transaction: Optional[Any] = None, metadata: bool = False,
+                long_running: bool = False) -> Dict:
+        with self.connection(transaction) as connection, connection.cursor() as cursor:
+            if params:
+                cursor.execute(self.convert(sql), self.adapt(params))
+            else:
+                cursor.execute(sql)
+            if not cursor.description:
+                return {'records': [], 'numberOfRecordsUpdated': max(cursor.rowcount, 0)}
+            response = {
+                'records'               : [[DataAPIBackend.value_dict(value) for value in row] for row in cursor.fetchall()],
+                'numberOfRecordsUpdated': 0
+            }
+            if metadata:
+                response['columnMetadata'] = [
+                    {'name': column.name, 'label': column.name, 'typeName': PG_TYPE_NAMES.get(column.type_code, '')}
+                    for column in cursor.description
+                ]
+            return response
+
+    @contextmanager
+    def _atomic(self, transaction: Optional[Any]):
+        """Cursor whose statements commit together: the caller's transaction, else one of its own"""
+        with self.connection(transaction) as connection, connection.cursor() as cursor:
+            if transaction is not None:
+                yield cursor
+                return
+            cursor.execute("BEGIN")
+            try:
+                yield cursor
+            except Exception:
+                if not connection.closed:
+                    cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    def execute_batch(self, sql: str, parameter_sets: List[Dict], transaction: Optional[Any] = None) -> Dict:
+        """All parameter sets in one round trip; outside a transaction they commit together, like a Data API batch"""
+        sql             = self.convert(sql)
+        parameter_sets  = [self.adapt(params) for params in parameter_sets]
+        with self._atomic(transaction) as cursor:
+            if psycopg is not None:
+                cursor.executemany(sql, parameter_sets)
+            else:
+                psycopg2.extras.execute_batch(cursor, sql, parameter_sets, page_size=len(parameter_sets))
+        return {'updateResults': [{} for _ in parameter_sets]}
+
+    @staticmethod
+    def csv_line(values: Iterator[Any]) -> str:
+        """One COPY ... (FORMAT csv) line: NULL unquoted and empty, every value quoted"""
+        fields = []
+        for value in values:
+            if value is None:
+                fields.append('')
+                continue
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            elif isinstance(value, bool):
+                value = 'true' if value else 'false'
+            fields.append('"' + str(value).replace('"', '""') + '"')
+        return ','.join(fields) + '\n'
+
+    def copy_merge(self, statements: Dict[str, str], lines: Iterator[str], transaction: Optional[Any] = None) -> Dict:
+        """Stream CSV lines into a temporary staging table and merge it with one statement, all in one transaction.
+        Returns the merge statement's records."""
+        with self._atomic(transaction) as cursor:
+            cursor.execute(statements['staging'])
+            if psycopg is not None:
+                with cursor.copy(statements['copy']) as copy:
+                    for line in lines:
+                        copy.write(line)
+            else:
+                cursor.copy_expert(statements['copy'], io.StringIO(''.join(lines)))
+            cursor.execute(statements['merge'])
+            records = [[DataAPIBackend.value_dict(value) for value in row] for row in cursor.fetchall()]
+            cursor.execute(statements['drop'])
+        return {'records': records}
+
+    def begin(self) -> Any:
+        connection = self._acquire()
+        try:
+            connection.cursor().execute("BEGIN")
+        except Exception:
+            self._release(connection)
+            raise
+        return connection
+
+    def _finish(self, transaction: Any, command: str):
+        try:
+            transaction.cursor().execute(command)
+        finally:
+            self._release(transaction)
+
+    def commit(self, transaction: Any):
+        self._finish(transaction, "COMMIT")
+
+    def rollback(self, transaction: Any):
+        self._finish(transaction, "ROLLBACK")
+
+
+# The postgres pool is shared by every file and warm invocation of the process
+_POSTGRES_BACKEND: Optional[PostgresBackend] = None
+_POSTGRES_BACKEND_LOCK = threading.Lock()
+
+def database_backend(client: Optional[Any] = None) -> Union[DataAPIBackend, PostgresBackend]:
+    """Backend selected by DB_BACKEND; falls back to the Data API when the postgres backend cannot be used"""
+    global _POSTGRES_BACKEND
+    if DB_BACKEND == 'postgres':
+        if psycopg is None and psycopg2 is None:
+            print(f"{FAIL} DB_BACKEND=postgres needs psycopg or psycopg2 installed, using the Data API")
+        elif not AURORA_ENDPOINT:
+            print(f"{FAIL} DB_BACKEND=postgres needs AURORA_ENDPOINT, using the Data API")
+        else:
+            with _POSTGRES_BACKEND_LOCK:
+                if _POSTGRES_BACKEND is None:
+                    _POSTGRES_BACKEND = PostgresBackend(AURORA_ENDPOINT, AURORA_PORT, DB_NAME or '', ARN_SECRET or '')
+            return _POSTGRES_BACKEND
+    elif DB_BACKEND != 'data-api':
+        print(f"{FAIL} Unknown DB_BACKEND {DB_BACKEND}, using the Data API")
+    return DataAPIBackend(client or boto3.client('rds-data', region_name=REGION), ARN_AURORA or '', ARN_SECRET or '', DB_NAME or '')
+
+
+""" 3. DB MANAGER : Wrapper class that manages the database interactions. Insert, Update, Select Queries """
+class DBManager:
+    __slots__ = ('database', 'backend', 'cluster_arn', 'secret_arn', 'transaction_id', 'transaction_error', '_transaction_lock', 'stats')
+    
+    def __init__(self, database_name: str, cluster_arn: Optional[str] = None, secret_arn: Optional[str] = None, client: Optional[Any] = None,
+                 stats: Optional[LoadStats] = None, backend: Optional[Union[DataAPIBackend, PostgresBackend]] = None):
+        self.database       = database_name
+        self.cluster_arn    = cluster_arn or os.environ['AURORA_CLUSTER_ARN']
+        self.secret_arn     = secret_arn or os.environ['AURORA_SECRET_ARN']
+        self.backend        = backend or DataAPIBackend(client or boto3.client('rds-data', region_name=REGION), self.cluster_arn, self.secret_arn, self.database)
+
+        # Set while a file is loaded inside transaction(); every statement is then sent inside this backend transaction
+        self.transaction_id: Optional[Any]              = None
+        self.transaction_error: Optional[Exception]     = None
+        self._transaction_lock                          = threading.Lock()
+
+        # Statement counts, bytes and latencies are recorded here when set
+        self.stats: Optional[LoadStats]                 = stats
+
+    def _get_postgres_type(self, field_name: str, table: Optional[str] = None) -> Optional[str]:
+        """Get PostgreSQL type for field, from the table's own columns when known"""
+        table_types = self._get_table_column_types().get(table) if table else None
+        if table_types is not None and field_name in table_types:
+            return table_types[field_name]
+        return COLUMN_TYPES.get(field_name)
+
+    def _get_table_column_types(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """Cast per column for every table in the schema, loaded once per cold start"""
+        global _TABLE_COLUMN_TYPES
+        if _TABLE_COLUMN_TYPES is not None:
+            return _TABLE_COLUMN_TYPES
+
+        with _TABLE_COLUMN_TYPES_LOCK:
+            if _TABLE_COLUMN_TYPES is None:
+                try:
+                    types: Dict[str, Dict[str, Optional[str]]] = {}
+                    response = self.execute_statement(COLUMN_TYPES_SQL)
+                    for record in response.get('records', []):
+                        table, column, data_type, udt_name = (next(iter(val.values())) for val in record)
+                        if data_type in CHARACTER_TYPES:
+                            pg_type = None
+                        elif data_type == 'USER-DEFINED':
+                            pg_type = udt_name
+                        elif data_type == 'ARRAY':
+                            pg_type = f"{udt_name.lstrip('_')}[]"
+                        else:
+                            pg_type = data_type
+                        types.setdefault(table, {})[column] = pg_type
+                    _TABLE_COLUMN_TYPES = types
+                except Exception as e:
+                    # Not cached, so the next call retries; casts fall back to COLUMN_TYPES
+                    print(f"{ERROR} Column type lookup error: {e}")
+                    return {}
+        return _TABLE_COLUMN_TYPES
+
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _validate_sql_identifier(identifier: str) -> bool:
+        """Validate SQL identifier to prevent injection"""
+        return bool(SQL_IDENTIFIER.match(identifier))
+
+    @staticmethod
+    def _statement(key: tuple, build) -> Dict[str, Any]:
+        """Cached SQL template for a statement shape, build() only runs on a miss.
+        Templates built while the column types are unknown use the COLUMN_TYPES fallback casts and are not cached."""
+        template = _STATEMENT_CACHE.get(key)
+        if template is not None:
+            with _STATEMENT_CACHE_LOCK:
+                STATEMENT_CACHE_STATS['hits'] += 1
+            return template
+
+        build_start = time.perf_counter()
+        template    = build()
+        with _STATEMENT_CACHE_LOCK:
+            STATEMENT_CACHE_STATS['misses']     += 1
+            STATEMENT_CACHE_STATS['build_time'] += time.perf_counter() - build_start
+            if _TABLE_COLUMN_TYPES is None:
+                # The catalog lookup failed, the next statement of this shape retries it
+                return template
+            if len(_STATEMENT_CACHE) >= STATEMENT_CACHE_SIZE:
+                _STATEMENT_CACHE.clear()
+            _STATEMENT_CACHE[key] = template
+        return template
+    
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _decoder(shape: tuple) -> tuple:
+        """(label, converter) per result column, built once per (label, type name) shape"""
         return tuple(
-            col.split(' as ')[-1].strip() if ' as ' in col.lower() 
-            else col.split('.')[-1].strip() 
-            for col in cols
+            (label, RESULT_TYPES.get('array' if type_name.startswith('_') else type_name))
+            for label, type_name in shape
         )
 
-    def _format_results(self, response: Dict, columns: tuple, single: bool = False) -> Union[List[Dict], Dict, None]:
-        """Lightning-fast result formatting"""
+    @classmethod
+    def _decode(cls, converter, value: Dict) -> Any:
+        value = cls._cell(value)
+        if value is None or converter is None:
+            return value
+        try:
+            return converter(value)
+        except (ValueError, TypeError, AttributeError):
+            return value
+
+    def _format_results(self, response: Dict, single: bool = False) -> Union[List[Dict], Dict, None]:
+        """Rows as dicts keyed by column label, values typed from the result's column metadata"""
         records = response.get('records', [])
         if not records:
             return None if single else []
-        
+
+        decoder = self._decoder(tuple(
+            (column.get('label') or column.get('name'), column.get('typeName', ''))
+            for column in response.get('columnMetadata', [])
+        ))
         results = [
-            {col: next(iter(val.values())) if val else None 
-             for col, val in zip(columns, record)}
-            for record in records
+            {label: self._decode(converter, val) for (label, converter), val in zip(decoder, record)}
+            for record in (records[:1] if single else records)
         ]
-        
+
         if single:
-            return results[0] if results else None
+            return results[0]
         return results
 
-    def execute_statement(self, sql: str, params: Optional[Dict] = None) -> Dict:
-        """Optimized execution"""
-        exec_params         = self._base_params.copy()
-        exec_params['sql']  = sql
-        
-        if params:
-            exec_params['parameters'] = self._format_parameters(params)
-        
-        return self.client.execute_statement(**exec_params)
+    def _send(self, request, size: int = 0) -> Dict:
+        """Send a backend request, inside the current transaction if there is one"""
+        if self.transaction_id is None:
+            return self._timed(request, None, size)
+
+        # Statements of one transaction share one connection, so they are sent one at a time.
+        # Any failure aborts the PostgreSQL transaction; it is remembered so the file gets rolled back.
+        with self._transaction_lock:
+            try:
+                return self._timed(request, self.transaction_id, size)
+            except Exception as e:
+                if not self._is_transient(e) and self.transaction_error is None:
+                    self.transaction_error = e
+                raise
+
+    def _timed(self, request, transaction: Optional[Any], size: int) -> Dict:
+        """Run one request and record its latency and estimated size"""
+        if self.stats is None:
+            return request(transaction=transaction)
+        started = time.perf_counter()
+        try:
+            return request(transaction=transaction)
+        finally:
+            self.stats.statement(size, time.perf_counter() - started)
+
+    def execute_statement(self, sql: str, params: Optional[Dict] = None, metadata: bool = False, long_running: bool = False) -> Dict:
+        """Optimized execution, with the result's column metadata when asked for"""
+        request = partial(self.backend.execute, sql, params, metadata=metadata, long_running=long_running)
+        return self._send(request, len(sql) + (self._payload_size(params) if params else 0))
+
+    @contextmanager
+    def transaction(self):
+        """Run every statement issued inside the block in one database transaction.
+        Commits on success; rolls back if the block raised or any statement failed."""
+        # Catalog lookups are cached per cold start and must not run inside the transaction
+        self._get_unique_indexes()
+        self._get_table_column_types()
+
+        self.transaction_error  = None
+        self.transaction_id     = transaction = self.backend.begin()
+        try:
+            yield self
+            if self.transaction_error is not None:
+                raise self.transaction_error
+            self.backend.commit(transaction)
+        except Exception:
+            try:
+                self.backend.rollback(transaction)
+            except Exception as e:
+                print(f"{ERROR} Rollback error: {e}")
+            raise
+        finally:
+            self.transaction_id = None
 
     def select(self, query: str, params: Optional[Dict] = None) -> List[Dict]:
         """Fast select multiple"""
         try:
-            response    = self.execute_statement(query, params)
-            columns     = self._extract_columns(query)
-            result      = self._format_results(response, columns)
+            response    = self.execute_statement(query, params, metadata=True)
+            result      = self._format_results(response)
             return result if isinstance(result, list) else []
         except Exception as e:
             print(f"{ERROR} Select error: {e}")
@@ -413,104 +1495,783 @@ class DBManager:
     def select_one(self, query: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """Fast select single"""
         try:
-            response    = self.execute_statement(query, params)
-            columns     = self._extract_columns(query)
-            result      = self._format_results(response, columns, single=True)
+            response    = self.execute_statement(query, params, metadata=True)
+            result      = self._format_results(response, single=True)
 
             return result if isinstance(result, dict) else None
         except Exception as e:
             print(f"{ERROR} Select one error: {e}")
             return None
 
+    def iter_select(self, query: str, params: Optional[Dict] = None, key: str = 'id', page_size: int = SELECT_PAGE_SIZE) -> Iterator[Dict]:
+        """Rows of query read page by page in key order, for results larger than one Data API response (1 MB).
+        The query must return the unique key column. Unlike select(), errors are raised."""
+        if not self._validate_sql_identifier(key):
+            raise ValueError(f"Invalid column name: {key}")
+
+        first   = f"SELECT * FROM ({query}) AS page ORDER BY page.{key} LIMIT {int(page_size)}"  # nosec B608
+        after   = f"SELECT * FROM ({query}) AS page WHERE page.{key} > :page_after ORDER BY page.{key} LIMIT {int(page_size)}"  # nosec B608
+        last    = None
+        while True:
+            if last is None:
+                rows = self._format_results(self.execute_statement(first, params, metadata=True))
+            else:
+                rows = self._format_results(self.execute_statement(after, {**(params or {}), 'page_after': last}, metadata=True))
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last = rows[-1][key]
+
+    def delete_expired(self, table: str, column: str, cutoff: date, batch_size: int = RETENTION_BATCH_SIZE) -> Dict[str, int]:
+        """Delete rows of table whose column is before cutoff, batch_size rows per statement so locks stay short.
+        Returns the rows deleted and their size in bytes (row data, reclaimed for reuse once vacuumed)."""
+        for identifier in (table, column):
+            if not self._validate_sql_identifier(identifier):
+                raise ValueError(f"Invalid identifier: {identifier}")
+
+        query   = f"""
+            WITH expired AS (
+                DELETE FROM {table}
+                WHERE id IN (SELECT id FROM {table} WHERE {column} < :cutoff::date LIMIT {int(batch_size)})
+                RETURNING pg_column_size({table}.*) AS bytes
+            )
+            SELECT COUNT(*) AS row_count, COALESCE(SUM(bytes), 0)::bigint AS bytes FROM expired
+        """  # nosec B608
+        deleted = {'rows': 0, 'bytes': 0}
+        while True:
+            batch = self._format_results(self.execute_statement(query, {'cutoff': str(cutoff)}, metadata=True), single=True)
+            deleted['rows']     += batch['row_count']
+            deleted['bytes']    += batch['bytes']
+            if batch['row_count'] < batch_size:
+                return deleted
+
+    def drop_partition(self, partition: str) -> Dict[str, int]:
+        """Drop a whole partition, returning the rows and bytes (table and indexes) it held"""
+        if not self._validate_sql_identifier(partition):
+            raise ValueError(f"Invalid partition name: {partition}")
+
+        size = self._format_results(self.execute_statement(
+            f"SELECT COUNT(*) AS row_count, pg_total_relation_size('{partition}') AS bytes FROM {partition}", metadata=True  # nosec B608
+        ), single=True)
+        self.execute_statement(f"DROP TABLE {partition}")  # nosec B608
+        return {'rows': size['row_count'], 'bytes': size['bytes']}
+
+    def _upsert_template(self, table: str, columns: tuple, unique_keys: tuple) -> Dict[str, Any]:
+        """Validated, typed SQL for one (table, columns, unique keys) shape of upsert"""
+        if not self._validate_sql_identifier(table):
+            raise ValueError(f"Invalid table name: {table}")
+
+        for key in unique_keys + columns:
+            if not self._validate_sql_identifier(key):
+                raise ValueError(f"Invalid column name: {key}")
+
+        casts = {col: self._get_postgres_type(col, table) for col in unique_keys + columns}
+        typed = lambda col: f":{col}::{casts[col]}" if casts[col] else f":{col}"
+
+        keys            = [key for key in unique_keys if key in columns]
+        where_clause    = ' AND '.join(f"{key} = {typed(key)}" for key in keys)
+        update_fields   = [f"{col} = {typed(col)}" for col in columns if col not in ['id', 'created_at']]
+
+        fingerprint     = f", {FINGERPRINT_COLUMN}" if FINGERPRINT_COLUMN in columns else ''
+
+        return {
+            'keys'  : keys,
+            'casts' : casts,
+            'select': f"SELECT id{fingerprint} FROM {table} WHERE {where_clause}" if keys else None,  # nosec B608
+            'update': f"UPDATE {table} SET {', '.join(update_fields)} WHERE {where_clause}" if keys and update_fields else None,  # nosec B608
+            'insert': f"INSERT INTO {table} ({','.join(columns)}) VALUES ({','.join(typed(col) for col in columns)})"  # nosec B608
+        }
+
     # Update & Insert = Upsert, this is used to update or insert into the Database
-    def upsert(self, table: str, data: Dict, unique_keys: Union[str, List[str]], stats: Optional[Dict] = None) -> str:
-        """Generic upsert method with type casting and flexible updated_at"""
+    @table_context
+    def upsert(self, table: str, data: Dict, unique_keys: Union[str, List[str]], stats: Optional[LoadStats] = None) -> str:
+        """Generic upsert method with type casting, SQL comes from the statement cache"""
         try:
-            if not self._validate_sql_identifier(table):
-                raise ValueError(f"Invalid table name: {table}")
-            
             if isinstance(unique_keys, str):
                 unique_keys = [unique_keys]
-            
-            for key in unique_keys + list(data.keys()):
-                if not self._validate_sql_identifier(key):
-                    raise ValueError(f"Invalid column name: {key}")
-            
-            where_conditions = []
-            where_params = {}
-            
-            for key in unique_keys:
-                if key in data:
-                    pg_type = self._get_postgres_type(key, AWS_TYPECAST_2)
-                    if pg_type:
-                        where_conditions.append(f"{key} = :{key}::{pg_type}")
-                    else:
-                        where_conditions.append(f"{key} = :{key}")
-                    where_params[key] = data[key]
-            
-            if not where_conditions:
+
+            if self._fingerprinted(table):
+                data = self._with_fingerprint(data)
+
+            columns     = tuple(data.keys())
+            template    = self._statement(
+                ('upsert', table, columns, tuple(unique_keys)),
+                lambda: self._upsert_template(table, columns, tuple(unique_keys))
+            )
+
+            if not template['keys']:
                 return 'error'
-            
-            where_clause = ' AND '.join(where_conditions)
-            
+
+            where_params = {key: data[key] for key in template['keys']}
+
             # Check if record exists
-            existing = self.select_one(f"SELECT id FROM {table} WHERE {where_clause}", where_params)  # nosec B608
+            existing = self.select_one(template['select'], where_params)
             
             if existing:
-                # Update existing - build typed SET clause
-                update_fields = []
-                for k in data.keys():
-                    if k not in ['id', 'created_at']:
-                        pg_type = self._get_postgres_type(k, AWS_TYPECAST_2)
-                        if pg_type:
-                            update_fields.append(f"{k} = :{k}::{pg_type}")
-                        else:
-                            update_fields.append(f"{k} = :{k}")
-                
-                if update_fields:
-                    # Only add updated_at if table has it (check by trying to describe table)
-                    update_query = f"UPDATE {table} SET {', '.join(update_fields)} WHERE {where_clause}"  # nosec B608
-                    self.execute_statement(update_query, {**data, **where_params})
-                    if stats: stats['UPDATED'] += 1
+                if FINGERPRINT_COLUMN in data and existing.get(FINGERPRINT_COLUMN) == data[FINGERPRINT_COLUMN]:
+                    # Same content as stored, nothing to write
+                    if stats is not None: stats.add('SKIPPED')
+                    return 'skipped'
+                elif template['update']:
+                    self.execute_statement(template['update'], data)
+                    if stats is not None: stats.add('UPDATED')
                     return 'updated'
                 else:
-                    if stats: stats['SKIPPED'] += 1
+                    if stats is not None: stats.add('SKIPPED')
                     return 'skipped'
             else:
-                # Insert new - build typed INSERT
-                cols = list(data.keys())
-                placeholders = []
-                for col in cols:
-                    pg_type = self._get_postgres_type(col, AWS_TYPECAST_2)
-                    if pg_type:
-                        placeholders.append(f":{col}::{pg_type}")
-                    else:
-                        placeholders.append(f":{col}")
-                
-                query = f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join(placeholders)})"  # nosec B608
-                result = self.execute_statement(query, data)
+                result = self.execute_statement(template['insert'], data)
                 
                 if result:
-                    if stats: stats['CREATED'] += 1
+                    if stats is not None: stats.add('CREATED')
                     return 'created'
                 else:
-                    if stats: stats['SKIPPED'] += 1
+                    if stats is not None: stats.add('SKIPPED')
                     return 'error'
                     
         except Exception as e:
             print(f"{ERROR} Upsert error for {table}: {e}")
-            if stats: stats['SKIPPED'] += 1
+            if stats is not None: stats.add('SKIPPED')
             return 'error'
 
+    def _fingerprinted(self, table: str) -> bool:
+        """True when table has a row_fingerprint column"""
+        return FINGERPRINT_COLUMN in self._get_table_column_types().get(table, {})
+
+    @staticmethod
+    def _with_fingerprint(row: Dict) -> Dict:
+        """Copy of row with a hash of its values, bookkeeping columns excluded"""
+        content = {k: v for k, v in row.items() if k not in FINGERPRINT_EXCLUDED}
+        digest  = hashlib.md5(json.dumps(content, sort_keys=True, default=str).encode('utf-8'), usedforsecurity=False).hexdigest()
+        return {**row, FINGERPRINT_COLUMN: digest}
+
+    def _get_unique_indexes(self) -> Dict[str, List[frozenset]]:
+        """Unique index column sets per table, loaded once per cold start"""
+        global _UNIQUE_INDEXES
+        if _UNIQUE_INDEXES is not None:
+            return _UNIQUE_INDEXES
+
+        with _UNIQUE_INDEXES_LOCK:
+            if _UNIQUE_INDEXES is None:
+                try:
+                    indexes: Dict[str, List[frozenset]] = {}
+                    response = self.execute_statement(UNIQUE_INDEX_SQL)
+                    for record in response.get('records', []):
+                        table, columns = (next(iter(val.values())) for val in record)
+                        indexes.setdefault(table, []).append(frozenset(columns.split(',')))
+                    _UNIQUE_INDEXES = indexes
+                except Exception as e:
+                    # Not cached, so the next call retries; callers fall back to row-by-row upsert
+                    print(f"{ERROR} Unique index lookup error: {e}")
+                    return {}
+        return _UNIQUE_INDEXES
+
+    def _conflict_target(self, table: str, unique_keys: List[str]) -> Optional[List[str]]:
+        """Return unique_keys if they match a unique index on table, else None"""
+        if frozenset(unique_keys) in self._get_unique_indexes().get(table, []):
+            return unique_keys
+        return None
+
+    def _build_bulk_upsert(self, table: str, columns: tuple, conflict_keys: List[str], row_count: int, returning: Optional[List[str]] = None) -> str:
+        """Build a multi-row INSERT ... ON CONFLICT DO UPDATE with typed placeholders"""
+        values = [
+            "(" + ','.join(self._typed_placeholder(table, col, f"{col}_{i}") for col in columns) + ")"
+            for i in range(row_count)
+        ]
+        returned = ''.join(f", {col}" for col in ['id'] + returning) if returning is not None else ''
+
+        if table in PARTITIONED_TABLES:
+            cols        = ','.join(columns)
+            returned    = ''.join(f", merged.{col}" for col in ['id'] + returning) if returning is not None else ''
+            return (
+                f"WITH incoming ({cols}) AS (VALUES {','.join(values)}), {self._existing_keys(table, conflict_keys, 'incoming')}, "  # nosec B608
+                f"merged AS (INSERT INTO {table} ({cols}) SELECT {cols} FROM incoming "
+                f"{self._conflict_action(table, columns, conflict_keys, returning)} RETURNING *) "
+                f"SELECT {self._inserted(conflict_keys)} AS inserted{returned} FROM merged"
+            )
+        return (
+            f"INSERT INTO {table} ({','.join(columns)}) VALUES {','.join(values)} "  # nosec B608
+            f"{self._conflict_action(table, columns, conflict_keys, returning)} RETURNING (xmax = 0) AS inserted{returned}"
+        )
+
+    @staticmethod
+    def _existing_keys(table: str, conflict_keys: List[str], source: str) -> str:
+        """CTE of the keys of source already in table. Partitioned tables cannot return the xmax system column,
+        so an upsert into one tells inserted from updated rows by these keys, read in the statement's own snapshot."""
+        keys = ','.join(conflict_keys)
+        return f"existing AS (SELECT {keys} FROM {table} JOIN {source} USING ({keys}))"  # nosec B608
+
+    @staticmethod
+    def _inserted(conflict_keys: List[str]) -> str:
+        """True for a merged row whose key was not in the existing CTE"""
+        return f"NOT EXISTS (SELECT 1 FROM existing WHERE {' AND '.join(f'existing.{key} = merged.{key}' for key in conflict_keys)})"
+
+    @staticmethod
+    def _conflict_action(table: str, columns: tuple, conflict_keys: List[str], returning: Optional[List[str]] = None) -> str:
+        """ON CONFLICT clause shared by the VALUES and the COPY upserts"""
+        update_fields = [f"{col} = EXCLUDED.{col}" for col in columns if col not in conflict_keys and col not in ['id', 'created_at']]
+        if not update_fields and returning is not None:
+            # DO NOTHING would not return the existing row's id
+            update_fields = [f"{conflict_keys[0]} = EXCLUDED.{conflict_keys[0]}"]
+        action = f"DO UPDATE SET {', '.join(update_fields)}" if update_fields else "DO NOTHING"
+        if update_fields and FINGERPRINT_COLUMN in columns:
+            # Unchanged rows are neither rewritten nor returned
+            action += f" WHERE {table}.{FINGERPRINT_COLUMN} IS DISTINCT FROM EXCLUDED.{FINGERPRINT_COLUMN}"
+        return f"ON CONFLICT ({','.join(conflict_keys)}) {action}"
+
+    def _build_copy_merge(self, table: str, columns: tuple, conflict_keys: List[str]) -> Dict[str, str]:
+        """Statements of a COPY upsert. The staging table is a session-local temporary table (never WAL-logged)
+        with the target's column types, so COPY parses every value the way an INSERT would."""
+        staging = f"{table}_staging"
+        cols    = ','.join(columns)
+        if table in PARTITIONED_TABLES:
+            merge = (
+                f"WITH {self._existing_keys(table, conflict_keys, staging)}, merged AS (INSERT INTO {table} ({cols}) SELECT {cols} FROM {staging} "  # nosec B608
+                f"{self._conflict_action(table, columns, conflict_keys)} RETURNING {','.join(conflict_keys)}) "
+                f"SELECT count(*) FILTER (WHERE {self._inserted(conflict_keys)}), count(*) FROM merged"
+            )
+        else:
+            merge = (
+                f"WITH merged AS (INSERT INTO {table} ({cols}) SELECT {cols} FROM {staging} "  # nosec B608
+                f"{self._conflict_action(table, columns, conflict_keys)} RETURNING (xmax = 0) AS inserted) "
+                f"SELECT count(*) FILTER (WHERE inserted), count(*) FROM merged"
+            )
+        return {
+            'staging'   : f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA",  # nosec B608
+            'copy'      : f"COPY {staging} ({cols}) FROM STDIN WITH (FORMAT csv)",
+            'merge'     : merge,
+            'drop'      : f"DROP TABLE {staging}"
+        }
+
+    def _upsert_rows_per_statement(self, table: str, columns: tuple, conflict_keys: List[str], returning: Optional[List[str]] = None) -> int:
+        """Rows per multi-row upsert: UPSERT_BATCH_SIZE, fewer on the Data API when the SQL of that many rows
+        would exceed DATA_API_MAX_SQL_CHARS (wide tables with long typed placeholders)"""
+        if not isinstance(self.backend, DataAPIBackend):
+            return UPSERT_BATCH_SIZE
+
+        def build() -> Dict[str, int]:
+            sql_length  = lambda rows: len(self._build_bulk_upsert(table, columns, conflict_keys, rows, returning))
+            full        = sql_length(UPSERT_BATCH_SIZE)
+            if full <= DATA_API_MAX_SQL_CHARS or UPSERT_BATCH_SIZE == 1:
+                return {'rows': UPSERT_BATCH_SIZE}
+            one         = sql_length(1)
+            per_row     = -(-(full - one) // (UPSERT_BATCH_SIZE - 1))
+            rows        = max(1, min(UPSERT_BATCH_SIZE, (DATA_API_MAX_SQL_CHARS - one) // per_row + 1))
+            # Placeholder suffixes grow with the row index, step down until the text fits
+            while rows > 1 and sql_length(rows) > DATA_API_MAX_SQL_CHARS:
+                rows -= 1
+            return {'rows': rows}
+
+        key = ('bulk_rows', table, columns, tuple(conflict_keys), tuple(returning) if returning is not None else None)
+        return self._statement(key, build)['rows']
+
+    def _payload_size(self, params: Dict) -> int:
+        """Estimated serialized size of one parameter set ({"name": .., "value": {"stringValue": ..}} per entry)"""
+        return sum(len(key) + len(str(value)) + 40 for key, value in params.items())
+
+    def _split_by_payload(self, items: List[Dict], max_count: int, base_bytes: int = 0):
+        """Yield chunks of at most max_count items whose estimated payload stays under DATA_API_MAX_PAYLOAD_BYTES"""
+        chunk, chunk_bytes = [], base_bytes
+        for item in items:
+            item_bytes = self._payload_size(item)
+            if chunk and (len(chunk) >= max_count or chunk_bytes + item_bytes > DATA_API_MAX_PAYLOAD_BYTES):
+                yield chunk
+                chunk, chunk_bytes = [], base_bytes
+            chunk.append(item)
+            chunk_bytes += item_bytes
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Errors where the request never ran and can be sent again as is"""
+        if isinstance(error, ClientError):
+            return error.response.get('Error', {}).get('Code') in DATA_API_TRANSIENT_ERRORS
+        return isinstance(error, (EndpointConnectionError, ConnectTimeoutError) + POSTGRES_TRANSIENT_ERRORS)
+
+    def _run_with_split(self, items: List, run, label: str, attempt: int = 0) -> List:
+        """Run items as one request. Transient errors are retried with backoff, statement errors
+        bisect the items so only the failing sub-batch is retried. Returns the items that failed."""
+        try:
+            run(items)
+            return []
+        except Exception as e:
+            if self._is_transient(e) and attempt < DATA_API_MAX_RETRIES:
+                time.sleep(min(0.2 * 2 ** attempt, 5) + random.uniform(0, 0.1))  # nosec B311
+                return self._run_with_split(items, run, label, attempt + 1)
+            if self.transaction_id is not None:
+                raise   # The transaction is aborted, retrying a sub-batch inside it cannot succeed
+            if len(items) == 1:
+                print(f"{FAIL} {label} failed for 1 row: {e}")
+                return items
+            mid = len(items) // 2
+            return self._run_with_split(items[:mid], run, label) + self._run_with_split(items[mid:], run, label)
+
+    def batch_execute(self, sql: str, parameter_sets: List[Dict]) -> int:
+        """BatchExecuteStatement transport: same SQL text, many parameterSets per request.
+        Requests are split to stay under the Data API limits. Returns the number of parameter sets applied."""
+        applied = 0
+
+        def run(sets: List[Dict]):
+            nonlocal applied
+            self._send(partial(self.backend.execute_batch, sql, sets), len(sql) + sum(self._payload_size(params) for params in sets))
+            applied += len(sets)
+
+        for chunk in self._split_by_payload(parameter_sets, DATA_API_MAX_PARAMETER_SETS, len(sql)):
+            self._run_with_split(chunk, run, "Batch statement")
+        return applied
+
+    def _typed_placeholder(self, table: str, column: str, name: str) -> str:
+        pg_type = self._get_postgres_type(column, table)
+        return f":{name}::{pg_type}" if pg_type else f":{name}"
+
+    @staticmethod
+    def text_array(values: List[str]) -> str:
+        """PostgreSQL array literal, bound as one string and cast with ::text[] (the Data API has no array parameters)"""
+        return '{' + ','.join('"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values) + '}'
+
+    @staticmethod
+    def _cell(value: Dict) -> Any:
+        """Plain value of one Data API field"""
+        return None if not value or value.get('isNull') else next(iter(value.values()))
+
+    def _upsert_on_conflict(self, table: str, columns: tuple, conflict_keys: List[str], rows: List[Dict], counts: Dict[str, int],
+                            returning: Optional[List[str]] = None, returned: Optional[List[Dict]] = None):
+        """Multi-row INSERT ... ON CONFLICT DO UPDATE, one statement per chunk"""
+        def run(chunk: List[Dict]):
+            query   = self._statement(
+                ('bulk', table, columns, tuple(conflict_keys), len(chunk), tuple(returning) if returning is not None else None),
+                lambda: {'sql': self._build_bulk_upsert(table, columns, conflict_keys, len(chunk), returning)}
+            )['sql']
+            params  = {f"{col}_{i}": row[col] for i, row in enumerate(chunk) for col in columns}
+            records = self.execute_statement(query, params).get('records', [])
+
+            created = sum(1 for record in records if record[0].get('booleanValue'))
+            counts['created'] += created
+            counts['updated'] += len(records) - created
+            counts['skipped'] += len(chunk) - len(records)
+
+            if returning is not None and returned is not None:
+                if len(records) < len(chunk) and FINGERPRINT_COLUMN in columns:
+                    # Rows skipped by the fingerprint check return nothing, read the chunk's ids back
+                    returned.extend(
+                        dict(zip(['id'] + returning, match[1:]))
+                        for match in self._match_rows(table, conflict_keys, chunk, ['id'] + returning)
+                    )
+                else:
+                    returned.extend(
+                        {col: self._cell(val) for col, val in zip(['id'] + returning, record[1:])}
+                        for record in records
+                    )
+
+        for chunk in self._split_by_payload(rows, self._upsert_rows_per_statement(table, columns, conflict_keys, returning)):
+            failed = self._run_with_split(chunk, run, f"Upsert into {table}")
+            counts['skipped'] += len(failed)
+
+    def _upsert_copy(self, table: str, columns: tuple, conflict_keys: List[str], rows: List[Dict], counts: Dict[str, int]):
+        """COPY the rows into a staging table and merge them with one INSERT ... SELECT ... ON CONFLICT"""
+        statements  = self._statement(('copy', table, columns, tuple(conflict_keys)), lambda: self._build_copy_merge(table, columns, conflict_keys))
+        lines       = [PostgresBackend.csv_line(row[col] for col in columns) for row in rows]
+        request     = partial(self.backend.copy_merge, statements, lines)
+        records     = self._send(request, sum(len(line) for line in lines)).get('records', [])
+
+        inserted, written = (self._cell(val) or 0 for val in records[0]) if records else (0, 0)
+        counts['created'] += inserted
+        counts['updated'] += written - inserted
+        counts['skipped'] += len(rows) - written
+
+    def _match_rows(self, table: str, keys: List[str], rows: List[Dict], columns: List[str]) -> List[List]:
+        """Match rows to existing table rows on keys, one SELECT per chunk against a VALUES list.
+        Returns [row index, *columns] per match."""
+        def build(row_count: int) -> Dict[str, str]:
+            values  = ','.join(
+                "(" + ','.join([f":row_idx_{i}"] + [self._typed_placeholder(table, key, f"{key}_{i}") for key in keys]) + ")"
+                for i in range(row_count)
+            )
+            return {'sql': (
+                f"SELECT DISTINCT v.row_idx{''.join(f', t.{col}' for col in columns)} "  # nosec B608
+                f"FROM (VALUES {values}) AS v(row_idx, {', '.join(keys)}) "
+                f"JOIN {table} t ON {' AND '.join(f't.{key} = v.{key}' for key in keys)}"
+            )}
+
+        matches = []
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            chunk   = rows[start:start + UPSERT_BATCH_SIZE]
+            params  = {f"row_idx_{i}": start + i for i in range(len(chunk))}
+            params.update({f"{key}_{i}": row[key] for i, row in enumerate(chunk) for key in keys})
+            query   = self._statement(
+                ('match', table, tuple(keys), len(chunk), tuple(columns)),
+                lambda: build(len(chunk))
+            )['sql']
+            for record in self.execute_statement(query, params).get('records', []):
+                matches.append([self._cell(val) for val in record])
+        return matches
+
+    def _upsert_batched(self, table: str, columns: tuple, keys: List[str], rows: List[Dict], counts: Dict[str, int],
+                        returning: Optional[List[str]] = None, returned: Optional[List[Dict]] = None):
+        """Upsert for tables without a unique index on keys: a keyed SELECT finds
+        the existing rows, then UPDATEs and INSERTs go out through batch_execute"""
+        if FINGERPRINT_COLUMN in columns:
+            matches     = self._match_rows(table, keys, rows, [FINGERPRINT_COLUMN])
+            existing    = {match[0] for match in matches}
+            # Existing rows whose stored fingerprint differs; the rest are unchanged and skipped
+            changed     = {match[0] for match in matches if match[1] != rows[match[0]][FINGERPRINT_COLUMN]}
+            counts['skipped'] += len(existing - changed)
+        else:
+            existing    = {match[0] for match in self._match_rows(table, keys, rows, [])}
+            changed     = existing
+
+        updates = [row for idx, row in enumerate(rows) if idx in changed]
+        inserts = [row for idx, row in enumerate(rows) if idx not in existing]
+
+        # Same statements as the row-by-row upsert, sent as one batch each
+        template = self._statement(
+            ('upsert', table, columns, tuple(keys)),
+            lambda: self._upsert_template(table, columns, tuple(keys))
+        )
+        if updates and template['update']:
+            applied = self.batch_execute(template['update'], updates)
+            counts['updated'] += applied
+            counts['skipped'] += len(updates) - applied
+        else:
+            counts['skipped'] += len(updates)
+
+        if inserts:
+            applied = self.batch_execute(template['insert'], inserts)
+            counts['created'] += applied
+            counts['skipped'] += len(inserts) - applied
+
+        if returning is not None and returned is not None:
+            # Batched writes return nothing, so the ids are read back in the same keyed way
+            returned.extend(
+                dict(zip(['id'] + returning, match[1:]))
+                for match in self._match_rows(table, keys, rows, ['id'] + returning)
+            )
+
+    @table_context
+    def bulk_upsert(self, table: str, rows: List[Dict], unique_keys: Union[str, List[str]], stats: Optional[LoadStats] = None,
+                    returning: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Set-based upsert. Rows are grouped by column set and de-duplicated on the key (last row wins,
+        as sequential upserts would). Keys matching a unique index use INSERT ... ON CONFLICT, or COPY into
+        a staging table and one merge for large groups on the postgres backend; other tables use a keyed
+        SELECT followed by batched UPDATE/INSERT.
+        With returning, result['rows'] holds {'id', *returning} as stored for every written row."""
+        counts = {'created': 0, 'updated': 0, 'skipped': 0}
+        returned: List[Dict] = []
+        if not rows:
+            return {**counts, 'rows': returned}
+
+        if isinstance(unique_keys, str):
+            unique_keys = [unique_keys]
+
+        try:
+            if not self._validate_sql_identifier(table):
+                raise ValueError(f"Invalid table name: {table}")
+
+            for col in returning or []:
+                if not self._validate_sql_identifier(col):
+                    raise ValueError(f"Invalid column name: {col}")
+
+            if self._fingerprinted(table):
+                rows = [self._with_fingerprint(row) for row in rows]
+
+            conflict_keys = self._conflict_target(table, unique_keys)
+
+            groups: Dict[tuple, Dict[tuple, Dict]] = {}
+            for idx, row in enumerate(rows):
+                keys = [key for key in unique_keys if key in row]
+                if not keys:
+                    counts['skipped'] += 1
+                    continue
+
+                # NULLs never match, so such rows are always distinct inserts
+                if any(row[key] is None for key in keys):
+                    row_key = ('__null__', idx)
+                else:
+                    row_key = tuple(repr(row[key]) for key in keys)
+
+                group = groups.setdefault(tuple(sorted(row.keys())), {})
+                if row_key in group:
+                    # Superseded by a later row with the same key, never written
+                    counts['skipped'] += 1
+                group[row_key] = row
+
+            # Column names are validated once per column set rather than per row
+            for columns in groups:
+                for key in columns:
+                    if not self._validate_sql_identifier(key):
+                        raise ValueError(f"Invalid column name: {key}")
+
+            for columns, group in groups.items():
+                group_rows = list(group.values())
+                if conflict_keys and all(key in columns for key in conflict_keys):
+                    if returning is None and len(group_rows) >= COPY_THRESHOLD and isinstance(self.backend, PostgresBackend):
+                        try:
+                            self._upsert_copy(table, columns, conflict_keys, group_rows, counts)
+                            continue
+                        except Exception as e:
+                            if self.transaction_id is not None:
+                                raise
+                            # The merge runs in its own transaction, so nothing was written
+                            print(f"{FAIL} COPY upsert failed for {table}, retrying with INSERT statements: {e}")
+                    self._upsert_on_conflict(table, columns, conflict_keys, group_rows, counts, returning, returned)
+                    continue
+                try:
+                    self._upsert_batched(table, columns, [key for key in unique_keys if key in columns], group_rows, counts, returning, returned)
+                except Exception as e:
+                    if self.transaction_id is not None:
+                        raise
+                    # The keyed SELECT failed before anything was written, so the row-by-row path is safe
+                    print(f"{FAIL} Batched upsert failed for {table}, retrying row by row: {e}")
+                    for row in group_rows:
+                        result = self.upsert(table, row, unique_keys)
+                        counts[result if result in counts else 'skipped'] += 1
+                    if returning is not None:
+                        keys = [key for key in unique_keys if key in columns]
+                        returned.extend(
+                            dict(zip(['id'] + returning, match[1:]))
+                            for match in self._match_rows(table, keys, group_rows, ['id'] + returning)
+                        )
+        except Exception as e:
+            print(f"{ERROR} Bulk upsert error for {table}: {e}")
+            counts['skipped'] += len(rows) - sum(counts.values())
+
+        if stats is not None:
+            stats.add('CREATED', counts['created'])
+            stats.add('UPDATED', counts['updated'])
+            stats.add('SKIPPED', counts['skipped'])
+            stats.rows(table, counts['created'] + counts['updated'], counts['skipped'])
+        return {**counts, 'rows': returned}
+
+""" 3a. DIMENSION CACHE : Account and product ids shared by every file and warm invocation """
+class DimensionCache:
+    """(account_id, region) -> account and lower(product name) -> (id, name), bulk loaded once and
+    reloaded after DIMENSION_CACHE_TTL seconds. New rows arrive through each file's DimensionOverlay."""
+    __slots__ = ('accounts', 'products', 'loaded_at', 'lock', 'stats')
+
+    def __init__(self):
+        self.accounts: Dict[tuple, Dict] = {}
+        self.products: Dict[str, tuple] = {}
+        self.loaded_at  = None
+        self.lock       = threading.Lock()
+        self.stats      = {'hits': 0, 'misses': 0, 'loads': 0}
+
+    def _ensure(self, db: DBManager):
+        """Bulk load both maps when empty or older than the TTL"""
+        if self.loaded_at is not None and time.time() - self.loaded_at < DIMENSION_CACHE_TTL:
+            return
+        with self.lock:
+            if self.loaded_at is not None and time.time() - self.loaded_at < DIMENSION_CACHE_TTL:
+                return
+            # A failed load raises and leaves the cache empty, so callers never see a partial map
+            accounts = list(db.iter_select("SELECT id, account_id, region FROM accounts"))
+            products = list(db.iter_select("SELECT id, name FROM products"))
+            self.accounts = {
+                (row['account_id'], row['region']): {'id': row['id'], 'account_id': row['account_id']}
+                for row in accounts
+            }
+            self.products = {}
+            for row in products:
+                # Lowest id wins for names that differ only in case, like the first match of the old lookup
+                self.products.setdefault(row['name'].lower(), (row['id'], row['name']))
+            self.loaded_at = time.time()
+            self.stats['loads'] += 1
+
+    def invalidate(self):
+        """Drop everything, e.g. after a rollback that may have undone written-through rows"""
+        with self.lock:
+            self.accounts, self.products, self.loaded_at = {}, {}, None
+
+    def account(self, db: DBManager, account_id: str, region: str) -> Optional[Dict]:
+        self._ensure(db)
+        found = self.accounts.get((account_id, region))
+        with self.lock:
+            self.stats['hits' if found else 'misses'] += 1
+        return found
+
+    def put_account(self, row: Dict, region: str):
+        with self.lock:
+            self.accounts[(row['account_id'], region)] = {'id': row['id'], 'account_id': row['account_id']}
+
+    def product_ids(self, db: DBManager, names: List[str]) -> Dict[str, tuple]:
+        """Known products among names as {lower name: (id, stored name)}"""
+        self._ensure(db)
+        found = {name.lower(): self.products[name.lower()] for name in names if name.lower() in self.products}
+        with self.lock:
+            self.stats['hits']   += len(found)
+            self.stats['misses'] += len({name.lower() for name in names}) - len(found)
+        return found
+
+    def put_products(self, rows: List[Dict]):
+        with self.lock:
+            for row in rows:
+                self.products[row['name'].lower()] = (row['id'], row['name'])
+
+DIMENSIONS = DimensionCache()
+
+class DimensionOverlay:
+    """One file's view of a DimensionCache. Rows written inside the file's transaction are kept here and only
+    published to the shared cache once it committed, so other files never reuse an id that may still be
+    rolled back. Outside a transaction rows are written through at once."""
+    __slots__ = ('cache', 'db', 'accounts', 'products', 'lock')
+
+    def __init__(self, cache: DimensionCache, db: DBManager):
+        self.cache      = cache
+        self.db         = db
+        self.accounts: Dict[tuple, Dict] = {}
+        self.products: Dict[str, tuple] = {}
+        self.lock       = threading.Lock()
+
+    def account(self, account_id: str, region: str) -> Optional[Dict]:
+        with self.lock:
+            found = self.accounts.get((account_id, region))
+        return found or self.cache.account(self.db, account_id, region)
+
+    def put_account(self, row: Dict, region: str):
+        if self.db.transaction_id is None:
+            self.cache.put_account(row, region)
+            return
+        with self.lock:
+            self.accounts[(row['account_id'], region)] = {'id': row['id'], 'account_id': row['account_id']}
+
+    def product_ids(self, names: List[str]) -> Dict[str, tuple]:
+        """Known products among names as {lower name: (id, stored name)}, this file's own rows first"""
+        with self.lock:
+            own = {name.lower(): self.products[name.lower()] for name in names if name.lower() in self.products}
+        return {**self.cache.product_ids(self.db, [name for name in names if name.lower() not in own]), **own}
+
+    def put_products(self, rows: List[Dict]):
+        if self.db.transaction_id is None:
+            self.cache.put_products(rows)
+            return
+        with self.lock:
+            for row in rows:
+                self.products[row['name'].lower()] = (row['id'], row['name'])
+
+    def publish(self):
+        """Hand the rows of the committed transaction to the shared cache"""
+        with self.lock:
+            accounts, products = self.accounts, self.products
+            self.accounts, self.products = {}, {}
+        for (_, region), account in accounts.items():
+            self.cache.put_account(account, region)
+        self.cache.put_products([{'id': product_id, 'name': name} for product_id, name in products.values()])
+
+""" 3b. LOAD SCHEDULER : Runs loader tasks for every file in one pool, parents before children """
+# Table each section (or security sub-section) writes first, used for the per-table cap
+SECTION_TABLES  =   {
+                        'account'           : 'accounts',
+                        'config'            : 'config_reports',
+                        'service'           : 'services',
+                        'cost'              : 'cost_reports',
+                        'security'          : 'security',
+                        'inventory'         : 'inventory_instances',
+                        'marketplace'       : 'marketplace_usage',
+                        'trusted_advisor'   : 'trusted_advisor_checks',
+                        'health'            : 'health_events',
+                        'application'       : 'application_signals',
+                        'resilience_hub'    : 'resilience_hub_apps',
+                        'service_resources' : 'service_resources',
+                        'compute_optimizer' : 'compute_optimizer',
+                        'ri_sp_savings'     : 'ri_sp_daily_savings',
+                        'config_inventory'  : 'config_inventory',
+                        'support_tickets'   : 'support_tickets',
+                        'logs'              : 'logs'
+                    }
+SECURITY_TABLES =   {
+                        'guard_duty'            : 'guard_duty_findings',
+                        'kms'                   : 'kms_keys',
+                        'waf'                   : 'waf_rules',
+                        'waf_rules'             : 'waf_rules_detailed',
+                        'cloudtrail'            : 'cloudtrail_logs',
+                        'secrets_manager'       : 'secrets_manager_secrets',
+                        'certificate_manager'   : 'certificates',
+                        'inspector'             : 'inspector_findings'
+                    }
+
+class LoadScheduler:
+    """Process-wide task pool shared by every file and warm invocation. A task waits for the tasks it
+    depends on, then runs with at most LOADER_WORKERS tasks overall and TABLE_WORKERS per table.
+    Tasks never block on each other, dependents are released by done-callbacks.
+    With FILE_TRANSACTION (the default) every statement of a file is serialized on its transaction's
+    connection, so LOADER_WORKERS and TABLE_WORKERS give no parallelism within a file: they only overlap
+    the writes of different files. Splitting a section into tasks then bounds their size, not their time."""
+    __slots__ = ('executor', 'lock', 'running', 'waiting', 'table_limit')
+
+    def __init__(self, workers: int = LOADER_WORKERS, table_limit: int = TABLE_WORKERS):
+        self.executor       = ThreadPoolExecutor(max_workers=workers)
+        self.lock           = threading.Lock()
+        self.running: Dict[str, int] = {}
+        self.waiting: Dict[str, deque] = {}
+        self.table_limit    = table_limit
+
+    @staticmethod
+    def when_done(futures: List[Future], callback):
+        """Call callback() once every future is done, whatever its outcome"""
+        if not futures:
+            callback()
+            return
+        remaining   = [len(futures)]
+        lock        = threading.Lock()
+
+        def one_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            callback()
+
+        for future in futures:
+            future.add_done_callback(one_done)
+
+    def submit(self, table: str, fn, *args, after: List[Future] = ()) -> Future:
+        """Future of fn(*args) writing to table, started once every future in after is done"""
+        future = Future()
+        self.when_done(list(after), lambda: self._ready(table, future, fn, args))
+        return future
+
+    def _ready(self, table: str, future: Future, fn, args: tuple):
+        with self.lock:
+            if self.running.get(table, 0) >= self.table_limit:
+                self.waiting.setdefault(table, deque()).append((future, fn, args))
+                return
+            self.running[table] = self.running.get(table, 0) + 1
+        self.executor.submit(self._run, table, future, fn, args)
+
+    def _run(self, table: str, future: Future, fn, args: tuple):
+        try:
+            result, error = fn(*args), None
+        except Exception as e:
+            result, error = None, e
+
+        # Hand the table slot to the next waiting task before dependents are released
+        with self.lock:
+            queue = self.waiting.get(table)
+            following = queue.popleft() if queue else None
+            if following is None:
+                self.running[table] -= 1
+        if following is not None:
+            self.executor.submit(self._run, table, *following)
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+SCHEDULER = LoadScheduler()
+
 ###END: HELPER CLASSES###
 
 """ 4. CORE MANAGER : Manages the Data Loadign from the JSON File to Aurora Postgres """
 class CoreManager:
-    def __init__(self):
-        self.sts_client = boto3.client('sts')
-        self.db         = DBManager(database_name=DB_NAME or '', cluster_arn=ARN_AURORA, secret_arn=ARN_SECRET)
-        self.stats      = {'CREATED': 0, 'UPDATED': 0, 'SKIPPED': 0, 'TOTAL': 0, 'LOADED': 0}
+    """One instance per file: curr_acct and stats belong to the file being loaded"""
+    def __init__(self, db_client: Optional[Any] = None, db_backend: Optional[Union[DataAPIBackend, PostgresBackend]] = None):
+        self.stats      = LoadStats()
+        self.db         = DBManager(database_name=DB_NAME or '', cluster_arn=ARN_AURORA, secret_arn=ARN_SECRET, client=db_client, stats=self.stats,
+                                    backend=db_backend)
         self.curr_acct  = None  
+        self.failed     = set()     # Sections whose loader reported a failure
+        self.dimensions = DimensionOverlay(DIMENSIONS, self.db)
 
     def set_log(self, log_type:AWSLogType, topic:AWSResourceType, msg=None):
         message = msg if msg is not None else "Data Loaded"
@@ -569,16 +2330,15 @@ class CoreManager:
                         account_data["csp"] = self._get_default_account("csp", "AWS")
 
                 # Upsert account
-                result = self.db.upsert('accounts', account_data, ['account_id', 'region'], self.stats)
+                result = self.db.bulk_upsert('accounts', [account_data], ['account_id', 'region'], self.stats, returning=['account_id'])
+                region = account_data.get('region') or 'Global'
                 
-                # Get current account for other operations
-                if result in ['created', 'updated']:
-                    account_result = self.db.select_one(
-                        "SELECT id, account_id FROM accounts WHERE account_id = :account_id AND region = :region",
-                        {'account_id': data['account_id'], 'region':data['region']}
-                    )
-                    if account_result:
-                        self.curr_acct = account_result
+                # Current account for other operations, straight from RETURNING
+                if result['rows']:
+                    self.curr_acct = result['rows'][0]
+                    self.dimensions.put_account(self.curr_acct, region)
+                else:
+                    self.curr_acct = self.dimensions.account(account_data['account_id'], region)
 
                 # Load product if exists (AFTER curr_acct is set)
                 if 'product' in data and data['product'] and self.curr_acct is not None:
@@ -588,21 +2348,22 @@ class CoreManager:
             contact = data.get('contact_info', {})
             if contact and any(v is not None for v in contact.values()) and self.curr_acct is not None:
                 contact['account_id'] = self.curr_acct['id']
-                self.db.upsert('contact_info', contact, 'account_id', self.stats)
+                self.db.bulk_upsert('contact_info', [contact], 'account_id', self.stats)
             
             # Process alternate contacts (children)
             alt_contacts = data.get('alternate_contacts', {})
             if alt_contacts and self.curr_acct is not None:
-                for contact_type, contact_data in alt_contacts.items():
-                    if contact_data:
-                        contact_record = {
-                            'account_id'    : self.curr_acct['id'],
-                            'contact_type'  : contact_type,
-                            'full_name'     : contact_data.get('name'),
-                            'title'         : contact_data.get('title'),
-                            'email'         : contact_data.get('email')
-                        }
-                        self.db.upsert('alternate_contacts', contact_record, ['account_id', 'contact_type'], self.stats)
+                contact_records = [
+                    {
+                        'account_id'    : self.curr_acct['id'],
+                        'contact_type'  : contact_type,
+                        'full_name'     : contact_data.get('name'),
+                        'title'         : contact_data.get('title'),
+                        'email'         : contact_data.get('email')
+                    }
+                    for contact_type, contact_data in alt_contacts.items() if contact_data
+                ]
+                self.db.bulk_upsert('alternate_contacts', contact_records, ['account_id', 'contact_type'], self.stats)
             
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.ACCOUNT)
             return True
@@ -620,51 +2381,55 @@ class CoreManager:
             # Split by comma and process each product
             products = [p.strip() for p in product_name.split(',') if p.strip()]
             
-            # Get product IDs for new products
-            new_product_ids = []
-            for prod in products:
-                if self._load_product(prod):
-                    product = self.db.select_one("SELECT id FROM products WHERE LOWER(name) = LOWER(:name)", {'name': prod})
-                    if product:
-                        new_product_ids.append(product['id'])
+            # Get product IDs, creating new products
+            new_product_ids = self._load_products(products)
             
+            # Link products to account
+            self.db.bulk_upsert('product_accounts', 
+                                [{'product_id': product_id, 'account_id': self.curr_acct['id']} for product_id in new_product_ids], 
+                                ['product_id', 'account_id'], self.stats)
+
             # Remove old product links not in new list
             if new_product_ids:
                 placeholders            = ','.join([f':id{i}' for i in range(len(new_product_ids))])
                 params                  = {f'id{i}': pid for i, pid in enumerate(new_product_ids)}
                 params['account_id']    = self.curr_acct['id']
                 
-                self.db.execute_statement(f"DELETE FROM product_accounts WHERE account_id = :account_id AND product_id NOT IN ({placeholders})", params)  # nosec B608
+                response = self.db.execute_statement(f"DELETE FROM product_accounts WHERE account_id = :account_id AND product_id NOT IN ({placeholders})", params)  # nosec B608
+                self.stats.rows('product_accounts', response.get('numberOfRecordsUpdated', 0), 0)
 
             
             return True
         except Exception as e:
+            # A cached id may point at a deleted product, reload on the next lookup
+            DIMENSIONS.invalidate()
             print(f"{ERROR} Product load error: {e}")
             return False
     
-    def _load_product(self, product_name: str) -> bool:
-        """Load single product and link to account"""
-        try:
-            # Check if product exists (case-insensitive)
-            product = self.db.select_one("SELECT id FROM products WHERE LOWER(name) = LOWER(:name)", {'name': product_name})
-            
-            if product:
-                # Update existing product
-                self.db.upsert('products', {'id': product['id'], 'name': product_name, 'owner': 'System'}, 'id', self.stats)
-            else:
-                # Create new product
-                self.db.upsert('products', {'name': product_name, 'owner': 'System'}, 'name', self.stats)
-                product = self.db.select_one("SELECT id FROM products WHERE LOWER(name) = LOWER(:name)", {'name': product_name})
-            
-            if product and self.curr_acct is not None:
-                # Link product to account
-                self.db.upsert('product_accounts', 
-                              {'product_id': product['id'], 'account_id': self.curr_acct['id']}, 
-                              ['product_id', 'account_id'], self.stats)
-            return True
-        except Exception as e:
-            print(f"{ERROR} Single product load error: {e}")
-            return False
+    def _load_products(self, product_names: List[str]) -> List[int]:
+        """Ids of the named products (case-insensitive), missing products are created in one statement"""
+        known   = self.dimensions.product_ids(product_names)
+        missing = {name.lower(): name for name in product_names if name.lower() not in known}
+
+        # Existing products are only rewritten when the spelling changed
+        renamed = {name.lower(): name for name in product_names if name.lower() in known and known[name.lower()][1] != name}
+        if renamed:
+            rows = [{'id': known[key][0], 'name': name, 'owner': 'System'} for key, name in renamed.items()]
+            self.db.bulk_upsert('products', rows, 'id', self.stats)
+            self.dimensions.put_products(rows)
+
+        if missing:
+            result = self.db.bulk_upsert('products', [{'name': name, 'owner': 'System'} for name in missing.values()], 'name',
+                                         self.stats, returning=['name'])
+            self.dimensions.put_products(result['rows'])
+            known = self.dimensions.product_ids(product_names)
+
+        ids = []
+        for name in product_names:
+            product = known.get(name.lower())
+            if product is not None and product[0] not in ids:
+                ids.append(product[0])
+        return ids
     #Method: UPSERT
     def load_config_data(self, data: Dict) -> bool:
         """Load config data with parent-child upsert like inventory"""
@@ -676,21 +2441,22 @@ class CoreManager:
             non_compliant   = data.pop('non_compliant_resources', [])
             # Load config report first (parent)
             data['account_id']  = self.curr_acct['id']
-            result              = self.db.upsert('config_reports', data, ['account_id', 'date_from'], self.stats)
+            result              = self.db.bulk_upsert('config_reports', [data], ['account_id', 'date_from'], self.stats, returning=[])
             
-            # Get config_report_id for resources
-            if result in ['created', 'updated']:
-                db_config = self.db.select_one(
-                    "SELECT id FROM config_reports WHERE account_id = :account_id AND date_from = :date_from::date",
-                    {'account_id': self.curr_acct['id'], 'date_from': data['date_from']}
-                )
+            # config_report_id for resources
+            if result['rows']:
+                db_config = result['rows'][0]
                 
                 # Load non-compliant resources (children)
                 if db_config and non_compliant:
                     for resource in non_compliant:
-                        resource['created_at']          = resource.pop('config_rule_invoked_time', None)
+                        invoked_time = resource.pop('config_rule_invoked_time', None)
+                        # created_at holds the rule's invocation time, as it always has; it is now the partition key,
+                        # so a rule without one keeps the column default (load time) instead of NULL
+                        if invoked_time:
+                            resource['created_at']      = invoked_time
                         resource['config_report_id']    = db_config['id']
-                        self.db.upsert('non_compliant_resources', resource, ['config_report_id', 'resource_id', 'rule_name'], self.stats)
+                    self.db.bulk_upsert('non_compliant_resources', non_compliant, ['config_report_id', 'resource_id', 'rule_name'], self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.CONFIG)
             return True
@@ -713,6 +2479,7 @@ class CoreManager:
             }
             
             if isinstance(data, list):
+                services = []
                 for service in data:
                     # Filter to only schema fields
                     filtered_service                = {k: v for k, v in service.items() if k in service_fields}
@@ -721,9 +2488,11 @@ class CoreManager:
                     # Convert usage_types array to comma-separated string
                     if 'usage_types' in filtered_service and isinstance(filtered_service['usage_types'], list):
                         filtered_service['usage_types'] = ','.join(str(item) for item in filtered_service['usage_types'])
+                    services.append(filtered_service)
                     
-                    # Upsert using composite unique key
-                    self.db.upsert('services', filtered_service, ['account_id', 'service', 'usage_types', 'date_from'], self.stats)
+                # Upsert using composite unique key
+                self.db.bulk_upsert('services', services, ['account_id', 'service', 'usage_types', 'date_from'], self.stats)
+                self._update_cost_rollups({service['date_from'] for service in services if service.get('date_from')})
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SERVICE)
             return True
@@ -733,21 +2502,23 @@ class CoreManager:
     #Method: UPSERT
     def load_cost_data(self, data: Dict) -> bool:
         """Load cost data with parent-child upsert like inventory"""
+        cost_report_id = self.load_cost_report(data)
+        if cost_report_id is False:
+            return False
+        return self.load_cost_children(data, cost_report_id)
+
+    def load_cost_report(self, data: Dict) -> Union[int, None, bool]:
+        """Load the cost report (parent) and return its id, False on error"""
         try:
             if not self.curr_acct:
                 print(f"{ERROR} No account loaded")
                 return False
             
-            cost_map = {}  # Map cost_report_id
+            period = data.get('period', {})
             
-            # Extract nested data
-            top_services = data.pop('top_services', [])
-            forecasts = data.pop('forecast', [])
-            period = data.pop('period', {})
-            
-            # Load cost report first (parent)
+            # Load cost report first (parent), nested children are loaded by load_cost_children
             cost_report =   {
-                                **data,
+                                **{k: v for k, v in data.items() if k not in ('top_services', 'forecast', 'period')},
                                 'account_id'        : self.curr_acct['id'],
                                 'period_start'      : period.get('start'),
                                 'period_end'        : period.get('end'),
@@ -755,50 +2526,53 @@ class CoreManager:
                                 'region'            : "Global"                  # Cost Explorer is a Global Service
                             }
             
-            result = self.db.upsert('cost_reports', cost_report, ['account_id', 'period_start', 'region'], self.stats)
+            result = self.db.bulk_upsert('cost_reports', [cost_report], ['account_id', 'period_start', 'region'], self.stats, returning=[])
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.COST, msg="Cost Reports Loaded")
 
-            # Get cost_report_id for children
-            if result in ['created', 'updated']:
-                db_cost = self.db.select_one(
-                    "SELECT id FROM cost_reports WHERE account_id = :account_id AND period_start = :period_start::date",
-                    {'account_id': self.curr_acct['id'], 'period_start': cost_report['period_start']}
-                )
-                if db_cost:
-                    cost_map['cost_report_id'] = db_cost['id']
+            # cost_report_id for children
+            return result['rows'][0]['id'] if result['rows'] else None
+        except Exception as e:
+            self.set_log(log_type=AWSLogType.ERROR, topic=AWSResourceType.COST, msg=e)
+            return False
+
+    def load_cost_children(self, data: Dict, cost_report_id: Optional[int], parts: tuple = ('top_services', 'forecast')) -> bool:
+        """Load service costs and forecasts (children) of a loaded cost report"""
+        try:
+            if not cost_report_id:
+                return True
             
             # Load service costs (children)
-            if top_services and cost_map:
-                cost_report_id = cost_map['cost_report_id']
-                
-                for service in top_services:
-                    service_data =  {
+            top_services = data.get('top_services', []) if 'top_services' in parts else []
+            if top_services:
+                service_costs = [
+                                    {
                                         'cost_report_id': cost_report_id,
                                         'service_name'  : service['service'],
                                         'cost'          : service['cost'],
                                         'region'        : "Global"                  # Cost Explorer is a Global Service
                                     }
-                    self.db.upsert('service_costs', service_data, ['cost_report_id', 'service_name', 'region'], self.stats)
+                                    for service in top_services
+                                ]
+                self.db.bulk_upsert('service_costs', service_costs, ['cost_report_id', 'service_name', 'region'], self.stats)
                 self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.COST, msg="Service Cost Loaded")
 
             # Load forecasts (children)
-            if forecasts and cost_map:
-                cost_report_id = cost_map['cost_report_id']
-                
-                for forecast in forecasts:
-                    forecast_data = {
+            forecasts = data.get('forecast', []) if 'forecast' in parts else []
+            if forecasts:
+                forecast_data = [
+                                    {
                                         'cost_report_id': cost_report_id,
                                         'period_start'  : forecast['period']['start'],
                                         'period_end'    : forecast['period']['end'],
                                         'amount'        : forecast['amount'],
                                         'region'        : "Global"                  # Cost Explorer is a Global Service
                                     }
-                    
-                    self.db.upsert('cost_forecasts', forecast_data, ['cost_report_id', 'period_start', 'region'], self.stats)
+                                    for forecast in forecasts
+                                ]
+                self.db.bulk_upsert('cost_forecasts', forecast_data, ['cost_report_id', 'period_start', 'region'], self.stats)
                 self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.COST, msg="Cost Forecast Loaded")
 
-            
             return True
         except Exception as e:
             self.set_log(log_type=AWSLogType.ERROR, topic=AWSResourceType.COST, msg=e)
@@ -843,92 +2617,48 @@ class CoreManager:
                                                 'account_id', 'finding_arn', 'severity', 'status', 'type', 
                                                 'title', 'description', 'first_observed_at'
                                             }
-            finding_fields              =   {
-                                                'security_id', 'finding_id', 'service', 'title', 'description',
-                                                'severity', 'status', 'resource_type', 'resource_id', 'created_at',
-                                                'updated_at', 'recommendation', 'compliance_status', 'region',
-                                                'workflow_state', 'record_state', 'product_name', 'company_name',
-                                                'product_arn', 'generator_id', 'generator'
-                                            }
-            security_map                =   {}  # Load Security Hub summaries first (parent), Map service to security_id Map service to security_id
-
-            # Load Security Hub summaries first (parent)
+            # Load Security Hub summaries first (parent), then their findings (children)
             if 'security_hub' in data:
-                for security_service in data['security_hub']:
-                    # Extract severity counts
-                    severity_counts = security_service.get('severity_counts', {})
-                    
-                    # Build security summary record directly
-                    if self.curr_acct is None:
-                        continue
-                    filtered_security = {
-                                            'account_id'            : self.curr_acct['id'],
-                                            'service'               : security_service.get('service'),
-                                            'total_findings'        : security_service.get('total_findings', 0),
-                                            'critical_count'        : severity_counts.get('CRITICAL', 0),
-                                            'high_count'            : severity_counts.get('HIGH', 0),
-                                            'medium_count'          : severity_counts.get('MEDIUM', 0),
-                                            'low_count'             : severity_counts.get('LOW', 0),
-                                            'informational_count'   : severity_counts.get('INFORMATIONAL', 0),
-                                            'open_findings'         : security_service.get('open_findings', 0),
-                                            'resolved_findings'     : security_service.get('resolved_findings', 0)
-                                        }
-                    
-                    # Upsert security summary
-                    result = self.db.upsert('security', filtered_security, ['account_id', 'service'], self.stats)
-                    
-                    # Get security_id for findings mapping
-                    if result in ['created', 'updated']:
-                        db_security = self.db.select_one(
-                            "SELECT id FROM security WHERE account_id = :account_id AND service = :service",
-                            {'account_id': self.curr_acct['id'], 'service': security_service.get('service')}
-                        )
-                        if db_security:
-                            security_map[security_service.get('service')] = db_security['id']
-            self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Secrity Hub Loaded")
-            # Load findings (children)
-            if 'security_hub' in data and security_map:
-                for security_service in data['security_hub']:
-                    service_name = security_service.get('service')
-                    if service_name in security_map and 'findings' in security_service:
-                        security_id = security_map[service_name]
-                        
-                        for finding in security_service['findings']:
-                            filtered_finding                = {k: v for k, v in finding.items() if k in finding_fields}
-                            filtered_finding['security_id'] = security_id
-                            
-                            self.db.upsert('findings', filtered_finding, 'finding_id', self.stats)
-            self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Secrity Hub Findings Loaded")
+                security_map = self.load_security_hub(data['security_hub'])
+                if security_map is False or not self.load_security_findings(self.security_findings(data['security_hub']), security_map):
+                    return False
             # Load GuardDuty findings
             if 'guard_duty' in data and self.curr_acct is not None:
+                guard_duty_findings = []
                 for finding in data['guard_duty']:
                     filtered_finding = {k: v for k, v in finding.items() if k in guard_duty_fields}
                     filtered_finding['account_id']      = self.curr_acct['id']
                     filtered_finding['detector_id']     = finding.get('id')  # Map 'id' to 'detector_id'
                     filtered_finding['finding_type']    = finding.get('type')  # Map 'type' to 'finding_type'
+                    guard_duty_findings.append(filtered_finding)
                     
-                    self.db.upsert('guard_duty_findings', filtered_finding, ['account_id', 'detector_id'], self.stats)
+                self.db.bulk_upsert('guard_duty_findings', guard_duty_findings, ['account_id', 'detector_id'], self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Guard Duty Loaded")
             # Load KMS keys
             if 'kms' in data and self.curr_acct is not None:
+                kms_keys = []
                 for key in data['kms']:
                     filtered_key = {k: v for k, v in key.items() if k in kms_fields}
                     filtered_key['account_id'] = self.curr_acct['id']
+                    kms_keys.append(filtered_key)
                     
-                    self.db.upsert('kms_keys', filtered_key, 'key_id', self.stats)
+                self.db.bulk_upsert('kms_keys', kms_keys, 'key_id', self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="KMS Loaded")
             # Load WAF rules
             if 'waf' in data and self.curr_acct is not None:
+                waf_rules = []
                 for waf in data['waf']:
                     filtered_waf = {k: v for k, v in waf.items() if k in waf_fields}
                     filtered_waf['account_id']  = self.curr_acct['id']
                     filtered_waf['waf_id']      = waf.get('id')  # Map 'id' to 'waf_id'
+                    waf_rules.append(filtered_waf)
                     
-                    self.db.upsert('waf_rules', filtered_waf, 'waf_id', self.stats)
+                self.db.bulk_upsert('waf_rules', waf_rules, 'waf_id', self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="WAF Loaded")
 
             # Load WAF rules detailed
             if 'waf_rules' in data and self.curr_acct is not None:
+                waf_rules_detailed = []
                 for rule in data['waf_rules']:
                     filtered_rule = {k: v for k, v in rule.items() if k in waf_rules_detailed_fields}
                     filtered_rule['account_id'] = self.curr_acct['id']
@@ -936,43 +2666,52 @@ class CoreManager:
                     # Convert action dict to JSON string for TEXT field
                     if 'action' in filtered_rule and isinstance(filtered_rule['action'], dict):
                         filtered_rule['action'] = json.dumps(filtered_rule['action'])
+                    waf_rules_detailed.append(filtered_rule)
                     
-                    self.db.upsert('waf_rules_detailed', filtered_rule, ['account_id', 'web_acl_name', 'rule_name'], self.stats)
+                self.db.bulk_upsert('waf_rules_detailed', waf_rules_detailed, ['account_id', 'web_acl_name', 'rule_name'], self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="WAF Rules Detailed Loaded")
 
             # Load CloudTrail logs
             if 'cloudtrail' in data and self.curr_acct is not None:
+                trails = []
                 for trail in data['cloudtrail']:
                     filtered_trail = {k: v for k, v in trail.items() if k in cloudtrail_fields}
                     filtered_trail['account_id'] = self.curr_acct['id']
+                    trails.append(filtered_trail)
                     
-                    self.db.upsert('cloudtrail_logs', filtered_trail, 'arn', self.stats)
+                self.db.bulk_upsert('cloudtrail_logs', trails, 'arn', self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Cloud Trail Loaded")
 
             # Load Secrets Manager secrets
             if 'secrets_manager' in data and self.curr_acct is not None:
+                secrets = []
                 for secret in data['secrets_manager']:
                     filtered_secret = {k: v for k, v in secret.items() if k in secrets_fields}
                     filtered_secret['account_id'] = self.curr_acct['id']
+                    secrets.append(filtered_secret)
                     
-                    self.db.upsert('secrets_manager_secrets', filtered_secret, 'arn', self.stats)
+                self.db.bulk_upsert('secrets_manager_secrets', secrets, 'arn', self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Secrets Manager Loaded")
 
             # Load Certificate Manager certificates
             if 'certificate_manager' in data and self.curr_acct is not None:
+                certificates = []
                 for cert in data['certificate_manager']:
                     filtered_cert = {k: v for k, v in cert.items() if k in cert_fields}
                     filtered_cert['account_id'] = self.curr_acct['id']
+                    certificates.append(filtered_cert)
                     
-                    self.db.upsert('certificates', filtered_cert, 'arn', self.stats)
+                self.db.bulk_upsert('certificates', certificates, 'arn', self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Certificate Manager Loaded")
             # Load Inspector findings
             if 'inspector' in data and self.curr_acct is not None:
+                inspector_findings = []
                 for finding in data['inspector']:
                     filtered_finding = {k: v for k, v in finding.items() if k in inspector_fields}
                     filtered_finding['account_id'] = self.curr_acct['id']
+                    inspector_findings.append(filtered_finding)
                     
-                    self.db.upsert('inspector_findings', filtered_finding, 'finding_arn', self.stats)
+                self.db.bulk_upsert('inspector_findings', inspector_findings, 'finding_arn', self.stats)
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Inspector Loaded")
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY)
@@ -980,6 +2719,73 @@ class CoreManager:
         except Exception as e:
             self.set_log(log_type=AWSLogType.ERROR, topic=AWSResourceType.COST, msg=e)
             return False
+    def load_security_hub(self, hub: List[Dict]) -> Union[Dict[str, int], bool]:
+        """Load Security Hub summaries (parent), returns service -> security_id, False on error"""
+        try:
+            security_map = {}  # Map service to security_id
+
+            if hub and self.curr_acct is not None:
+                security_rows = []
+                for security_service in hub:
+                    # Extract severity counts
+                    severity_counts = security_service.get('severity_counts', {})
+                    
+                    # Build security summary record directly
+                    security_rows.append({
+                                            'account_id'            : self.curr_acct['id'],
+                                            'service'               : security_service.get('service'),
+                                            'total_findings'        : security_service.get('total_findings', 0),
+                                            'critical_count'        : severity_counts.get('CRITICAL', 0),
+                                            'high_count'            : severity_counts.get('HIGH', 0),
+                                            'medium_count'          : severity_counts.get('MEDIUM', 0),
+                                            'low_count'             : severity_counts.get('LOW', 0),
+                                            'informational_count'   : severity_counts.get('INFORMATIONAL', 0),
+                                            'open_findings'         : security_service.get('open_findings', 0),
+                                            'resolved_findings'     : security_service.get('resolved_findings', 0)
+                                        })
+                    
+                # Upsert security summaries
+                result = self.db.bulk_upsert('security', security_rows, ['account_id', 'service'], self.stats, returning=['service'])
+                
+                # security_id for findings mapping
+                for db_security in result['rows']:
+                    security_map[db_security['service']] = db_security['id']
+            self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Secrity Hub Loaded")
+            return security_map
+        except Exception as e:
+            self.set_log(log_type=AWSLogType.ERROR, topic=AWSResourceType.SECURITY, msg=e)
+            return False
+
+    @staticmethod
+    def security_findings(hub: List[Dict]) -> List[tuple]:
+        """(summary service, finding) of every Security Hub summary, flattened so the findings can load in batches"""
+        return [(security_service.get('service'), finding) for security_service in hub for finding in security_service.get('findings') or []]
+
+    def load_security_findings(self, findings: List[tuple], security_map: Union[Dict[str, int], bool]) -> bool:
+        """Load Security Hub findings (children), given as security_findings() pairs, of the summaries in security_map"""
+        try:
+            finding_fields  =   {
+                                    'security_id', 'finding_id', 'service', 'title', 'description',
+                                    'severity', 'status', 'resource_type', 'resource_id', 'created_at',
+                                    'updated_at', 'recommendation', 'compliance_status', 'region',
+                                    'workflow_state', 'record_state', 'product_name', 'company_name',
+                                    'product_arn', 'generator_id', 'generator'
+                                }
+
+            if security_map:
+                rows = []
+                for service_name, finding in findings:
+                    if service_name in security_map:
+                        filtered_finding                = {k: v for k, v in finding.items() if k in finding_fields}
+                        filtered_finding['security_id'] = security_map[service_name]
+                        rows.append(filtered_finding)
+
+                self.db.bulk_upsert('findings', rows, 'finding_id', self.stats)
+            self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SECURITY, msg="Secrity Hub Findings Loaded")
+            return True
+        except Exception as e:
+            self.set_log(log_type=AWSLogType.ERROR, topic=AWSResourceType.SECURITY, msg=e)
+            return False
     #Method: UPSERT
     def load_inventory_data(self, data: Dict) -> bool:
         """Load inventory instances, applications, and patches with proper relationships"""
@@ -1003,48 +2809,93 @@ class CoreManager:
             
             # Load instances first
             if 'instances' in data and self.curr_acct is not None:
+                instances = []
                 for instance in data['instances'] :
                     filtered_instance               = {k: v for k, v in instance.items() if k in instance_fields}
                     filtered_instance['account_id'] = self.curr_acct['id']
+                    instances.append(filtered_instance)
                     
-                    result = self.db.upsert('inventory_instances', filtered_instance, ['instance_id','state','classification'], self.stats)
+                result = self.db.bulk_upsert('inventory_instances', instances, 'instance_id', self.stats, returning=['instance_id'])
                     
-                    if result in ['created', 'updated']:
-                        db_instance = self.db.select_one(
-                            "SELECT id FROM inventory_instances WHERE instance_id = :instance_id",
-                            {'instance_id': instance['instance_id']}
-                        )
-                        if db_instance:
-                            instance_map[instance['instance_id']] = db_instance['id']
+                for db_instance in result['rows']:
+                    instance_map[db_instance['instance_id']] = db_instance['id']
                 self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.INVENTORY, msg="Inventory Instances Loaded")
 
-            # Load applications
-            if 'applications' in data and instance_map and self.curr_acct is not None:
-                first_instance_db_id = next(iter(instance_map.values()))
-                
-                for app in data['applications']:
-                    filtered_app                = {k: v for k, v in app.items() if k in app_fields}
-                    filtered_app['instance_id'] = first_instance_db_id
-                    filtered_app['account_id']  = self.curr_acct['id']  # Add account_id
-                    self.db.upsert('inventory_applications', filtered_app, ['instance_id', 'name'], self.stats)
+            if self.curr_acct is not None and (data.get('applications') or data.get('patches')):
+                # Parents not returned by the upsert (e.g. it failed) are looked up together in one query
+                referenced = {item.get('instance_id') for key in ('applications', 'patches') for item in data.get(key) or []}
+                instance_map.update(self._instance_ids(referenced - instance_map.keys() - {None}))
+
+            # Load applications, each under its own instance
+            if 'applications' in data and self.curr_acct is not None:
+                applications = self._with_instance_ids(data['applications'], app_fields, instance_map)
+                self.db.bulk_upsert('inventory_applications', applications, ['instance_id', 'name'], self.stats)
                 self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.INVENTORY, msg="Inventory Applications Loaded")
 
-            # Load patches
-            if 'patches' in data and instance_map and self.curr_acct is not None:
-                first_instance_db_id = next(iter(instance_map.values()))
-                
-                for patch in data['patches']:
-                    filtered_patch                  = {k: v for k, v in patch.items() if k in patch_fields}
-                    filtered_patch['instance_id']   = first_instance_db_id
-                    filtered_patch['account_id']    = self.curr_acct['id']  # Add account_id
-                    
-                    self.db.upsert('inventory_patches', filtered_patch, ['instance_id', 'title'], self.stats)
+            # Load patches, each under its own instance
+            if 'patches' in data and self.curr_acct is not None:
+                patches = self._with_instance_ids(data['patches'], patch_fields, instance_map)
+                self.db.bulk_upsert('inventory_patches', patches, ['instance_id', 'title'], self.stats)
                 self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.INVENTORY, msg="Inventory Patches Loaded")
 
             return True
         except Exception as e:
             self.set_log(log_type=AWSLogType.ERROR, topic=AWSResourceType.INVENTORY, msg=e)
             return False
+    def _update_cost_rollups(self, days: set):
+        """Recompute the account's service_cost_daily rows for the loaded days, then service_cost_monthly for their months"""
+        # Schemas created before the rollup tables load services only
+        if not days or not set(COST_ROLLUPS) <= set(self.db._get_table_column_types()):
+            return
+        months  = sorted({date.fromisoformat(str(day)[:10]).replace(day=1) for day in days})
+        params  =   {
+                        'service_cost_daily'    : {'days': self.db.text_array(sorted(str(day)[:10] for day in days))},
+                        'service_cost_monthly'  : {'month_from': str(months[0]), 'month_to': str(add_months(months[-1], 1))}
+                    }
+
+        def recompute(db: DBManager):
+            db.execute_statement(COST_ROLLUP_LOCK_SQL, {'account_id': self.curr_acct['id']})
+            for table, query in COST_ROLLUPS.items():
+                with load_context(table=table):
+                    response = db.execute_statement(query, {'account_id': self.curr_acct['id'], **params[table]})
+                    self.stats.rows(table, response.get('numberOfRecordsUpdated', 0), 0)
+
+        if self.db.transaction_id is not None:
+            recompute(self.db)
+            return
+        # Without a file transaction the lock needs a transaction of its own, on a manager the other sections do not share
+        rollup_db = DBManager(database_name=self.db.database, cluster_arn=self.db.cluster_arn, secret_arn=self.db.secret_arn,
+                              stats=self.stats, backend=self.db.backend)
+        with rollup_db.transaction():
+            recompute(rollup_db)
+
+    def _instance_ids(self, instance_ids: set) -> Dict[str, int]:
+        """inventory_instances ids of the account's EC2 instance ids, in one query"""
+        if not instance_ids:
+            return {}
+        rows = self.db.select(
+            "SELECT id, instance_id FROM inventory_instances WHERE account_id = :account_id AND instance_id = ANY(:instance_ids::text[])",
+            {'account_id': self.curr_acct['id'], 'instance_ids': self.db.text_array(sorted(instance_ids))}
+        )
+        return {row['instance_id']: row['id'] for row in rows}
+
+    def _with_instance_ids(self, items: List[Dict], fields: set, instance_map: Dict[str, int]) -> List[Dict]:
+        """Filter items to fields and replace the EC2 instance id with the parent row id; orphans are skipped"""
+        rows, orphans = [], 0
+        for item in items:
+            instance_db_id = instance_map.get(item.get('instance_id'))
+            if instance_db_id is None:
+                orphans += 1
+                continue
+            row                 = {k: v for k, v in item.items() if k in fields}
+            row['instance_id']  = instance_db_id
+            row['account_id']   = self.curr_acct['id']
+            rows.append(row)
+        if orphans:
+            self.stats.add('SKIPPED', orphans)
+            print(f"{FAIL} {orphans} inventory item(s) skipped, their instance is not loaded")
+        return rows
+
     #Method: UPSERT
     def load_marketplace_data(self, data: List[Dict]) -> bool:
         """Load marketplace usage with blazing fast upsert"""
@@ -1056,18 +2907,20 @@ class CoreManager:
             }
             
             if isinstance(data, list) and self.curr_acct is not None:
+                items = []
                 for item in data:
                     # Filter to only schema fields
                     filtered_item               = {k: v for k, v in item.items() if k in marketplace_fields}
                     filtered_item['account_id'] = self.curr_acct['id']
+                    items.append(filtered_item)
                     
-                    # Upsert using composite unique key (account_id + product_code + period_start)
-                    self.db.upsert(
-                        'marketplace_usage', 
-                        filtered_item, 
-                        ['account_id', 'product_code', 'period_start'], 
-                        self.stats
-                    )
+                # Upsert using composite unique key (account_id + product_code + period_start)
+                self.db.bulk_upsert(
+                    'marketplace_usage', 
+                    items, 
+                    ['account_id', 'product_code', 'period_start'], 
+                    self.stats
+                )
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.MARKETPLACE)
             return True
@@ -1086,18 +2939,20 @@ class CoreManager:
                                 }
             
             if isinstance(data, list) and self.curr_acct is not None:
+                checks = []
                 for check in data:
                     # Filter to only schema fields
                     filtered_check = {k: v for k, v in check.items() if k in advisor_fields}
                     filtered_check['account_id'] = self.curr_acct['id']
+                    checks.append(filtered_check)
                     
-                    # Upsert using composite unique key (account_id + check_name)
-                    self.db.upsert(
-                                    'trusted_advisor_checks', 
-                                    filtered_check, 
-                                    ['account_id', 'check_name'], 
-                                    self.stats
-                                )
+                # Upsert using composite unique key (account_id + check_name)
+                self.db.bulk_upsert(
+                                'trusted_advisor_checks', 
+                                checks, 
+                                ['account_id', 'check_name'], 
+                                self.stats
+                            )
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.TRUSTED_ADVISOR)
 
@@ -1116,18 +2971,20 @@ class CoreManager:
                                 }
             
             if isinstance(data, list) and self.curr_acct is not None:
+                events = []
                 for event in data:
                     # Filter to only schema fields
                     filtered_event                  = {k: v for k, v in event.items() if k in health_fields}
                     filtered_event['account_id']    = self.curr_acct['id']
+                    events.append(filtered_event)
                     
-                    # Upsert using unique key (arn is unique for health events)
-                    self.db.upsert(
-                                    'health_events', 
-                                    filtered_event, 
-                                    'arn', 
-                                    self.stats
-                                )
+                # Upsert using unique key (arn is unique for health events)
+                self.db.bulk_upsert(
+                                'health_events', 
+                                events, 
+                                'arn', 
+                                self.stats
+                            )
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.HEALTH)
 
             return True
@@ -1144,6 +3001,7 @@ class CoreManager:
                             }
             
             if isinstance(data, list) and self.curr_acct is not None:
+                signals = []
                 for signal in data:
                     # Filter to only schema fields
                     filtered_signal                 = {k: v for k, v in signal.items() if k in app_fields}
@@ -1152,14 +3010,15 @@ class CoreManager:
                     # Convert key_attributes to JSON for JSONB storage
                     if 'key_attributes' in filtered_signal:
                         filtered_signal['key_attributes'] = json.dumps(filtered_signal['key_attributes'])
+                    signals.append(filtered_signal)
                     
-                    # Upsert using composite unique key (account_id + service_name)
-                    self.db.upsert(
-                                    'application_signals', 
-                                    filtered_signal, 
-                                    ['account_id', 'service_name'], 
-                                    self.stats
-                                )
+                # Upsert using composite unique key (account_id + service_name)
+                self.db.bulk_upsert(
+                                'application_signals', 
+                                signals, 
+                                ['account_id', 'service_name'], 
+                                self.stats
+                            )
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.APPLICATION)
             return True
         except Exception as e:
@@ -1177,13 +3036,15 @@ class CoreManager:
                                     }
             
             if isinstance(data, list) and self.curr_acct is not None:
+                apps = []
                 for app in data:
                     # Filter to only schema fields
                     filtered_app                = {k: v for k, v in app.items() if k in resilience_fields}
                     filtered_app['account_id']  = self.curr_acct['id']
+                    apps.append(filtered_app)
                     
-                    # Upsert using unique key (app_arn is unique for resilience hub apps)
-                    self.db.upsert('resilience_hub_apps', filtered_app, 'app_arn', self.stats)
+                # Upsert using unique key (app_arn is unique for resilience hub apps)
+                self.db.bulk_upsert('resilience_hub_apps', apps, 'app_arn', self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.RESILIENCE_HUB)
             return True
@@ -1205,6 +3066,7 @@ class CoreManager:
             numeric_fields  =   {'instance_count', 'min_size', 'max_size', 'available_ip_count', 'size_gb'}
 
             if isinstance(data, list) and self.curr_acct is not None:
+                resources = []
                 for resource in data:
                     # Filter to only schema fields
                     filtered_resource               = {k: v for k, v in resource.items() if k in resource_fields}
@@ -1213,9 +3075,10 @@ class CoreManager:
                     for field in numeric_fields:
                         if field in filtered_resource and filtered_resource[field] in ('', None):
                             filtered_resource[field] = None
+                    resources.append(filtered_resource)
 
-                    # Upsert using composite unique key (account_id + resource_id)
-                    self.db.upsert('service_resources', filtered_resource, ['account_id', 'resource_id'], self.stats)
+                # Upsert using composite unique key (account_id + resource_id)
+                self.db.bulk_upsert('service_resources', resources, ['account_id', 'resource_id'], self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SERVICE_RESOURCES)
             return True
@@ -1236,13 +3099,15 @@ class CoreManager:
                                     }
             
             if isinstance(data, list) and self.curr_acct is not None:
+                recommendations = []
                 for recommendation in data:
                     # Filter to only schema fields
                     filtered_rec                = {k: v for k, v in recommendation.items() if k in optimizer_fields}
                     filtered_rec['account_id']  = self.curr_acct['id']
+                    recommendations.append(filtered_rec)
                     
-                    # Upsert using unique key (resource_arn is unique for compute optimizer recommendations)
-                    self.db.upsert('compute_optimizer', filtered_rec, 'resource_arn', self.stats)
+                # Upsert using unique key (resource_arn is unique for compute optimizer recommendations)
+                self.db.bulk_upsert('compute_optimizer', recommendations, 'resource_arn', self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.COMPUTE_OPTIMIZER)
             return True
@@ -1262,13 +3127,15 @@ class CoreManager:
                                     }
 
             if isinstance(data, list) and self.curr_acct is not None:
+                inventories = []
                 for inventory in data:
                     # Filter to only schema fields
                     filtered_inventory                  = {k: v for k, v in inventory.items() if k in inventory_fields}
                     filtered_inventory['account_id']    = self.curr_acct['id']
+                    inventories.append(filtered_inventory)
 
-                    # Upsert using composite unique key (account_id + resource_id)
-                    self.db.upsert('config_inventory', filtered_inventory, ['account_id', 'resource_id'], self.stats)
+                # Upsert using composite unique key (account_id + resource_id)
+                self.db.bulk_upsert('config_inventory', inventories, ['account_id', 'resource_id'], self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.CONFIG_INVENTORY)
             return True
@@ -1289,13 +3156,15 @@ class CoreManager:
                 'submitted_by', 'language', 'date_from', 'date_to'
             }
             
+            tickets = []
             for ticket in data:
                 # Filter to only schema fields
                 filtered_ticket = {k: v for k, v in ticket.items() if k in ticket_fields}
                 filtered_ticket['account_id'] = self.curr_acct['id']
+                tickets.append(filtered_ticket)
                 
-                # Upsert using unique key (case_id is unique)
-                self.db.upsert('support_tickets', filtered_ticket, 'case_id', self.stats)
+            # Upsert using unique key (case_id is unique)
+            self.db.bulk_upsert('support_tickets', tickets, 'case_id', self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.SUPPORT_TICKETS)
             return True
@@ -1319,12 +3188,15 @@ class CoreManager:
                 'state', 'description'
             }
             
+            records = []
             for record in data:
                 filtered_record = {k: v for k, v in record.items() if k in ri_sp_fields}
                 filtered_record['account_id'] = self.curr_acct['id']
+                records.append(filtered_record)
                 
-                self.db.upsert('ri_sp_daily_savings', filtered_record, 
-                              ['account_id', 'subscription_id', 'date_from', 'date_to', 'reservation_type'], self.stats)
+            # Upsert using the ri_sp_daily_savings_unique constraint columns
+            self.db.bulk_upsert('ri_sp_daily_savings', records, 
+                                ['account_id', 'subscription_id', 'date_to', 'reservation_type'], self.stats)
 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.RI_SP_SAVINGS)
             return True
@@ -1360,34 +3232,31 @@ class CoreManager:
             if 'date_created' not in filtered_data:
                 filtered_data['date_created'] = datetime.now(timezone.utc)
             
-            result = self.db.upsert('logs', filtered_data, ['account_id', 'date_created'], self.stats)
+            result = self.db.bulk_upsert('logs', [filtered_data], ['account_id', 'date_created'], self.stats, returning=[])
             
             # Load messages (children)
-            if messages and result in ['created', 'updated']:
-                db_log = self.db.select_one(
-                    "SELECT id FROM logs WHERE account_id = :account_id ORDER BY date_created DESC LIMIT 1",
-                    {'account_id': self.curr_acct['id']}
-                )
+            if messages and result['rows']:
+                db_log = result['rows'][0]
                 
                 if db_log:
+                    message_rows = []
                     for message_item in messages:
                         if isinstance(message_item, dict):
                             # Handle dict format: {'type': 'message'}
                             for message_type, message_text in message_item.items():
-                                message_data    =   {
+                                message_rows.append({
                                                         'log_id': db_log['id'],
                                                         'message': str(message_text),
                                                         'message_type': message_type
-                                                    }
-                                self.db.upsert('log_messages', message_data, ['log_id', 'message_type'], self.stats)
+                                                    })
                         else:
                             # Handle string format
-                            message_data    =   {
+                            message_rows.append({
                                                     'log_id': db_log['id'],
                                                     'message': str(message_item),
                                                     'message_type': 'INFO'
-                                                }
-                            self.db.upsert('log_messages', message_data, ['log_id', 'message_type'], self.stats)
+                                                })
+                    self.db.bulk_upsert('log_messages', message_rows, ['log_id', 'message_type'], self.stats)
                 
             self.set_log(log_type=AWSLogType.SUCCESS, topic=AWSResourceType.LOGS)
             return True
@@ -1396,21 +3265,35 @@ class CoreManager:
             print(f"{ERROR} Logs load error: {e}")
             return False
 
-    def process_file_data(self, data: Dict, file_name: str) -> Dict:
-        """Process and load all data from file with parallel loading"""
-        self.stats['TOTAL'] += 1
-        
-        if not self.validate_data_structure(data):
-            print(f"{FAIL} Invalid data structure in {file_name}")
-            self.stats['SKIPPED'] += 1
-            return self.stats
-
-        # Phase 1: Load account first (required for self.curr_acct)
-        if data.get('account'):
-            self.load_account_data(data['account'])
-        
-        # Phase 2: Load all other data in parallel
-        loaders = {
+    def get_ledger(self, s3_key: str) -> Optional[Dict]:
+        """Ledger entry of the last successful load of s3_key, None if the ledger is off or missing"""
+        if not LEDGER_ENABLED or 'ingestion_ledger' not in self.db._get_table_column_types():
+            return None
+        entry = self.db.select_one(
+            "SELECT content_hash, payload_version, section_hashes FROM ingestion_ledger WHERE s3_key = :s3_key",
+            {'s3_key': s3_key}
+        )
+        if entry:
+            hashes                  = entry.get('section_hashes')
+            entry['section_hashes'] = json.loads(hashes) if isinstance(hashes, str) else (hashes or {})
+        return entry
+
+    def save_ledger(self, ledger: Dict):
+        """Record the loaded file; sections whose loader failed keep no hash so they load again next time"""
+        if not LEDGER_ENABLED or 'ingestion_ledger' not in self.db._get_table_column_types():
+            return
+        hashes = {section: value for section, value in ledger['section_hashes'].items() if section not in self.failed}
+        self.db.bulk_upsert('ingestion_ledger', [{
+            's3_key'            : ledger['s3_key'],
+            'content_hash'      : '' if self.failed else ledger['content_hash'],
+            'payload_version'   : ledger['payload_version'],
+            'section_hashes'    : hashes,
+            'updated_at'        : datetime.now(timezone.utc)
+        }], 's3_key')
+
+    def _section_loaders(self) -> Dict[str, Any]:
+        """Loader per top-level section, everything except account"""
+        return {
             'config'            : self.load_config_data,
             'service'           : self.load_service_data,
             'cost'              : self.load_cost_data,
@@ -1428,22 +3311,135 @@ class CoreManager:
             'support_tickets'   : self.load_support_tickets_data,
             'logs'              : self.load_logs_data
         }
+
+    def _submit(self, section: str, table: str, fn, *args, after: List[Future] = ()) -> Future:
+        """Submit one loader task, its statements are counted under section"""
+        def run():
+            with load_context(section=section):
+                return fn(*args)
+        return SCHEDULER.submit(table, run, after=after)
+
+    def _batches(self, section: str, table: str, loader, items: List, after: List[Future]) -> List[Future]:
+        """One task per TASK_BATCH_SIZE records, each after the previous so the file order is kept"""
+        futures = []
+        for start in range(0, len(items), TASK_BATCH_SIZE):
+            futures.append(self._submit(section, table, loader, items[start:start + TASK_BATCH_SIZE], after=after + futures[-1:]))
+        return futures
+
+    def _schedule(self, section: str, value: Any, after: List[Future]) -> List[Future]:
+        """Submit the tasks of one section. Cost reports and Security Hub summaries run before their
+        children, security sub-sections and list sections run as separate tasks."""
+        if section == 'cost' and isinstance(value, dict):
+            parent = self._submit(section, 'cost_reports', self.load_cost_report, value, after=after)
+            return [parent] + [
+                self._submit(section, table, lambda part=part: self.load_cost_children(value, parent.result(), (part,)), after=[parent])
+                for part, table in (('top_services', 'service_costs'), ('forecast', 'cost_forecasts')) if value.get(part)
+            ]
+
+        if section == 'security' and isinstance(value, dict):
+            futures = []
+            if 'security_hub' in value:
+                parent   = self._submit(section, 'security', self.load_security_hub, value['security_hub'], after=after)
+                futures += [parent] + self._batches(section, 'findings', lambda batch: self.load_security_findings(batch, parent.result()),
+                                                    self.security_findings(value['security_hub']), [parent])
+            for key, table in SECURITY_TABLES.items():
+                if isinstance(value.get(key), list):
+                    futures += self._batches(section, table, lambda batch, key=key: self.load_security_data({key: batch}), value[key], after)
+            return futures
+
+        loader = self._section_loaders()[section]
+        if isinstance(value, list):
+            return self._batches(section, SECTION_TABLES[section], loader, value, after)
+        return [self._submit(section, SECTION_TABLES[section], loader, value, after=after)]
+
+    def _collect(self, tasks: List[tuple]):
+        """Wait for (section, future) tasks and record the sections whose loader failed"""
+        wait([future for _, future in tasks])
+        for section, future in tasks:
+            if future.exception():
+                print(f"{ERROR}: {future.exception()}")
+                self.failed.add(section)
+            elif future.result() is False:
+                self.failed.add(section)
+
+    def process_file_data(self, data: Dict, file_name: str, skip: frozenset = frozenset()) -> Dict:
+        """Process and load all data from file on the shared scheduler, except the sections in skip"""
+        self.stats.add('TOTAL')
         
-        with ThreadPoolExecutor(max_workers=15) as executor:
-            futures = {executor.submit(loader, data[attr]): attr 
-                       for attr, loader in loaders.items() if data.get(attr)}
-            
-            for future in as_completed(futures):
-                attr = futures[future]
-                try:
-                    future.result()
-                except Exception as e:
-                    #print(f"{ERROR} Error loading {attr}: {e}")
-                    print(f"{ERROR}: {e}")
-                    continue
+        if not self.validate_data_structure(data):
+            print(f"{FAIL} Invalid data structure in {file_name}")
+            self.stats.add('SKIPPED')
+            return self.stats.summary()
+
+        # Account first (required for self.curr_acct), every other section depends on it
+        tasks = []
+        after = []
+        if data.get('account'):
+            account = self._submit('account', 'accounts', self.load_account_data, data['account'])
+            tasks.append(('account', account))
+            after   = [account]
         
-        self.stats['LOADED'] += 1
-        return self.stats
+        for attr in self._section_loaders():
+            if data.get(attr) and attr not in skip:
+                tasks += [(attr, future) for future in self._schedule(attr, data[attr], after)]
+
+        self._collect(tasks)
+        self.stats.add('LOADED')
+        return self.stats.summary()
+
+    def process_file_stream(self, sections: Any, file_name: str, skip: frozenset = frozenset()) -> Dict:
+        """Streaming counterpart of process_file_data. Sections arrive one at a time (list sections in batches)
+        and at most 2 x LOADER_WORKERS batches are held in memory. Sections that precede account are buffered.
+        The structure can only be validated at the end, so an invalid file raises to roll its transaction back."""
+        self.stats.add('TOTAL')
+
+        loaders     = self._section_loaders()
+        seen        = set()
+        pending     = []
+        in_flight   = threading.BoundedSemaphore(LOADER_WORKERS * 2)
+        last        = {}
+        tasks       = []
+        after       = []
+
+        def submit(section: str, value: Any):
+            if section not in loaders or not value or section in skip:
+                return
+            in_flight.acquire()
+            # Batches of one section load in file order, as a single call would
+            futures = self._schedule(section, value, after + last.get(section, []))
+            SCHEDULER.when_done(futures, in_flight.release)
+            last[section] = futures
+            tasks.extend((section, future) for future in futures)
+
+        try:
+            for section, value in sections:
+                seen.add(section)
+                if section == 'account':
+                    if value:
+                        account = self._submit('account', 'accounts', self.load_account_data, value)
+                        tasks.append(('account', account))
+                        after   = [account]
+                    for item in pending:
+                        submit(*item)
+                    pending = []
+                elif 'account' not in seen:
+                    pending.append((section, value))
+                else:
+                    submit(section, value)
+
+            for item in pending:
+                submit(*item)
+        finally:
+            # Submitted tasks use the file's transaction, they finish before it is committed or rolled back
+            wait([future for _, future in tasks])
+
+        self._collect(tasks)
+        if not self.validate_data_structure(dict.fromkeys(seen)):
+            self.stats.add('SKIPPED')
+            raise ValueError(f"Invalid data structure in {file_name}")
+
+        self.stats.add('LOADED')
+        return self.stats.summary()
 
 """ 5. Managing the Data Load Status """
 def process_data_status(status):
@@ -1451,11 +3447,11 @@ def process_data_status(status):
     
     if(len(status) > 0):
         status_arr = [
-            status['CREATED'],
-            status['UPDATED'],
-            status['SKIPPED'],
-            status['TOTAL'],
-            status['LOADED'],
+            status.get('CREATED', 0),
+            status.get('UPDATED', 0),
+            status.get('SKIPPED', 0),
+            status.get('TOTAL', 0),
+            status.get('LOADED', 0),
         ]
     
     loaded      = f"{SUCCESS} Loaded: {status_arr[4]} Records"
@@ -1468,51 +3464,437 @@ def process_data_status(status):
 
     return [total, loaded, not_loaded]
 
-def load_data():
+def process_load_breakdown(status: Dict, kind: str) -> List[str]:
+    """One summary line per table or section (kind), slowest first, to spot the bottleneck loader"""
+    lines   = []
+    groups  = status.get(kind, {})
+    for name, group in sorted(groups.items(), key=lambda item: item[1].get('time', 0), reverse=True):
+        latencies = group.get('latencies', {})
+        lines.append(
+            f"{TIMING}  {name}: {group.get('rows', 0)} rows, {group.get('skipped', 0)} skipped, "
+            f"{group.get('statements', 0)} statements, {round(group.get('bytes', 0) / 1024, 1)} KB, "
+            f"p50 {round(latency_percentile(latencies, 50) * 1000)} ms, p95 {round(latency_percentile(latencies, 95) * 1000)} ms, "
+            f"max {round(latency_percentile(latencies, 100) * 1000)} ms, {round(group.get('time', 0), 2)}s total"
+        )
+    return lines
+
+def merge_stats(total: Dict, stats: Dict) -> Dict:
+    """Add one file's stats into the run summary: numbers add up, latency histograms and breakdowns merge"""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            merge_stats(total.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            total.setdefault(key, []).extend(value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+def section_hash(value: Any) -> str:
+    """Short, key-order independent hash of one section, same as sender.py"""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+def ledger_entry(path: str, response: Dict, raw: Optional[bytes], data: Any) -> Dict:
+    """Ledger identity of a spoke file: hashes from the sender's metadata, else computed here
+    (streamed legacy files fall back to the ETag and get no section hashes)"""
+    metadata = response.get('Metadata', {})
+    if metadata.get('payload-sha256'):
+        content_hash = metadata['payload-sha256']
+    elif raw is not None:
+        content_hash = hashlib.sha256(raw).hexdigest()
+    else:
+        content_hash = response.get('ETag', '').strip('"')
+
+    if metadata.get('payload-sections'):
+        section_hashes = json.loads(metadata['payload-sections'])
+    elif isinstance(data, dict):
+        section_hashes = {section: section_hash(value) for section, value in data.items()}
+    else:
+        section_hashes = {}
+
+    return {
+        's3_key'            : PAYLOAD_SUFFIX.sub('', path),
+        'content_hash'      : content_hash,
+        'payload_version'   : metadata.get('payload-version', '1'),
+        'section_hashes'    : section_hashes
+    }
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` away from the month of `day`"""
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+def ensure_partitions(db_backend: Union[DataAPIBackend, PostgresBackend]) -> Dict:
+    """Create the missing monthly partitions of the partitioned tables.
+    Attaching a partition locks its parent, so this runs from sweeps and retention mode only, outside any file transaction."""
+    db          = DBManager(database_name=DB_NAME or '', cluster_arn=ARN_AURORA, secret_arn=ARN_SECRET, backend=db_backend)
+    existing    = {}
+    for row in db.select(PARTITIONS_SQL):
+        existing.setdefault(row['parent_name'], set()).add(row['partition_name'])
+
+    this_month  = date.today().replace(day=1)
+    policies    = retention_policies()
+    created     = 0
+    for table in PARTITIONED_TABLES:
+        # Schemas created before partitioning keep plain tables
+        if table not in existing:
+            continue
+        cutoff = retention_cutoff(table, policies.get(table))
+        for offset in range(-PARTITION_MONTHS_BACK, PARTITION_MONTHS_AHEAD + 1):
+            start       = add_months(this_month, offset)
+            partition   = f"{table}_{start:%Y_%m}"
+            # Months the retention job would drop again are not created
+            if partition in existing[table] or (cutoff and add_months(start, 1) <= cutoff):
+                continue
+            try:
+                # Attaching a month whose rows already sit in the default partition fails; those stay where they are
+                default = f"{table}_default"
+                if default in existing[table]:
+                    column  = PARTITIONED_TABLES[table]
+                    held    = db.select_one(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} >= :start::date AND {column} < :end::date) AS taken",  # nosec B608
+                                            {'start': str(start), 'end': str(add_months(start, 1))})
+                    if held is None or held['taken']:
+                        continue
+                db.execute_statement(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{add_months(start, 1)}')")  # nosec B608
+                created += 1
+            except Exception as e:
+                print(f"{FAIL} Partition {partition} not created: {e}")
+    return {'PARTITIONS_CREATED': created}
+
+def refresh_views(db_backend: Union[DataAPIBackend, PostgresBackend], result: Dict) -> Dict:
+    """Refresh the materialized summary views whose source tables were written in this run.
+    CONCURRENTLY keeps them readable by QuickSight while they refresh."""
+    changed = {table for table, group in result.get('tables', {}).items() if group.get('rows')}
+    views   = [view for view, tables in MATERIALIZED_VIEWS.items() if tables & changed]
+    if not REFRESH_VIEWS or not views:
+        return {}
+
+    refresh_start   = time.time()
+    db              = DBManager(database_name=DB_NAME or '', cluster_arn=ARN_AURORA, secret_arn=ARN_SECRET, backend=db_backend)
+    # Schemas created before the summary views were materialized have none of them
+    existing        = {row['matviewname'] for row in db.select("SELECT matviewname FROM pg_matviews WHERE schemaname = current_schema()")}
+    refreshed       = 0
+    skipped         = 0
+    for view in views:
+        if view not in existing:
+            continue
+        try:
+            db.execute_statement(REFRESH_VIEW_SQL.format(view=view), long_running=True)  # nosec B608
+            refreshed += 1
+        except Exception as e:
+            if f"refresh of {view} already running" in str(e):
+                print(f"{INFO} Refresh of {view} skipped: another invocation is refreshing it")
+                skipped += 1
+                continue
+            print(f"{FAIL} Refresh of {view} failed: {e}")
+    return {'VIEWS_REFRESHED': refreshed, 'VIEWS_SKIPPED': skipped, 'refresh_time_finish': round(time.time() - refresh_start, 2)}
+
+def load_file(core_s3: S3Manager, db_backend: Union[DataAPIBackend, PostgresBackend], file: Dict[str, str], archiver: Optional[S3Archiver] = None) -> Dict:
+    """Load a single S3 file with its own CoreManager, so curr_acct and stats are never shared between files.
+    With an archiver the move to loaded/ happens in the background."""
+    name, path  = file["file_name"], file["file_path"]
+    core_db     = CoreManager(db_backend=db_backend)
+    step_start  = time.time()
+
+    raw = None
+    try:
+        layout, body, size, response    = core_s3.open_payload(file_path=path)
+        streamed                        = layout == 'ndjson' or size > STREAM_THRESHOLD_BYTES
+        if layout == 'ndjson':
+            # Without a file transaction every section commits as it loads, so the manifest is checked first
+            data    = NDJSONSectionStream(body) if FILE_TRANSACTION else NDJSONSectionStream.verified(body)
+        elif streamed:
+            # Large files are parsed while loading, so peak memory follows the batch size
+            data    = JSONSectionStream(body)
+        else:
+            raw     = body.read()
+            data    = json.loads(raw)
+            if isinstance(data, str):
+                data = json.loads(data)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            # Another invocation already loaded and archived it
+            print(f"{INFO} {name} is no longer in data/, skipping")
+        else:
+            print(f"{FAIL} Error reading file {name}: {str(e)}")
+        return {}
+    except Exception as e:
+        print(f"{FAIL} Error reading file {name}: {str(e)}")
+        return {}
+
+    process = core_db.process_file_stream if streamed else core_db.process_file_data
+    try:
+        # Files already loaded with the same content are archived without touching the tables
+        ledger      = ledger_entry(path, response, raw, data)
+        previous    = core_db.get_ledger(ledger['s3_key'])
+        if previous and (previous['content_hash'], previous['payload_version']) == (ledger['content_hash'], ledger['payload_version']):
+            if archiver:
+                archiver.submit(path)
+            else:
+                core_s3.delete_files(file_path=path)
+            print(f"{INFO} {name} unchanged since its last load, archived without loading")
+            return {'TOTAL': 1, 'LOADED': 1, 'UNCHANGED': 1}
+
+        # Sections with the same hash as last time are skipped, account always loads (curr_acct)
+        skip = frozenset(
+            section for section, value in ledger['section_hashes'].items()
+            if previous and section != 'account' and previous['section_hashes'].get(section) == value
+        )
+        if skip:
+            print(f"{INFO} {name}: {len(skip)} unchanged section(s) skipped")
+
+        if FILE_TRANSACTION:
+            # All-or-nothing: the file is only moved once its transaction has committed
+            with core_db.db.transaction():
+                result = process(data, file_name=name, skip=skip)
+                core_db.save_ledger(ledger)
+            core_db.dimensions.publish()
+        else:
+            result = process(data, file_name=name, skip=skip)
+            core_db.save_ledger(ledger)
+        if archiver:
+            archiver.submit(path)
+        else:
+            core_s3.delete_files(file_path=path)
+        step_finish = round(time.time() - step_start, 2)
+        account_id  = core_db.curr_acct['account_id'] if core_db.curr_acct else 'Unknown'
+        print(f"{SUCCESS} {account_id}/{REGION}/{name} Data Loaded & File queued for loaded/ folder in {step_finish}s")
+        return result
+    except Exception as e:
+        # Ids written inside a rolled back transaction never left core_db.dimensions
+        print(f"{FAIL} Error loading file {name}, file left in data/: {str(e)}")
+        return {'TOTAL': 1}
+
+def event_files(event: Any) -> Optional[List[Dict[str, str]]]:
+    """data/ files named by an S3 notification, delivered directly or through SQS, SNS or EventBridge.
+    None when the event names no objects (schedule, manual run), which means sweep mode."""
+    if not isinstance(event, dict) or event.get('mode') == 'sweep':
+        return None
+
+    keys = []
+
+    def collect(message: Any):
+        if isinstance(message, str):
+            try:
+                message = json.loads(message)
+            except ValueError:
+                return
+        if not isinstance(message, dict):
+            return
+
+        # EventBridge "Object Created" (keys are not URL-encoded)
+        detail = message.get('detail')
+        if isinstance(detail, dict) and 'object' in detail:
+            keys.append((detail.get('bucket', {}).get('name'), detail['object'].get('key')))
+        # SNS envelope inside SQS
+        if message.get('Type') == 'Notification' and 'Message' in message:
+            collect(message['Message'])
+
+        for record in message.get('Records', []):
+            if 's3' in record:
+                # S3 notification keys are URL-encoded, spaces as '+'
+                keys.append((record['s3']['bucket'].get('name'), unquote_plus(record['s3']['object'].get('key', ''))))
+            elif 'body' in record:
+                collect(record['body'])
+            elif 'Sns' in record:
+                collect(record['Sns'].get('Message'))
+
+    collect(event)
+    if not keys:
+        return None
+
+    files, seen = [], set()
+    for bucket, key in keys:
+        if not key or not key.startswith('data/') or key in seen:
+            continue
+        if BUCKET and bucket and bucket != BUCKET:
+            print(f"{FAIL} Ignoring s3://{bucket}/{key}, not the analytics bucket")
+            continue
+        seen.add(key)
+        files.append({'file_name': key.split('/')[-1], 'file_path': key})
+    return files
+
+def load_data(files: Optional[List[Dict[str, str]]] = None):
+    """Load the given files (event mode), or sweep every file under data/"""
     load_time_start = time.time()
     
     core_s3 = S3Manager(BUCKET or '')
-    file_arr= core_s3.list_files(prefix="data/")
     
-    core_db = CoreManager()
-    #0. checking files to be loaded
+    # One backend shared by every worker, sized for all concurrent loader threads
+    db_backend = database_backend(boto3.client('rds-data', region_name=REGION, config=Config(max_pool_connections=FILE_WORKERS + LOADER_WORKERS)))
+    #0. checking files to be loaded, listed lazily so loading starts with the first page
     
-    result = {}
+    result      = {}
+    file_count  = 0
+    archiver    = S3Archiver(core_s3)
     try:
-        if(len(file_arr) > 0):
-            print(f"{INFO} Starting to Load {len(file_arr)} dataset(s)")
-            #1. load data
-            for file in file_arr:
-                name, path = file["file_name"], file["file_path"]
-                try:
-                    step_start = time.time()
-                    print(f"{INFO} Processing {path}", end='', flush=True)
-                    data    = core_s3.read_file(file_path=path)
-                    if isinstance(data, str):
-                        data = json.loads(data)
-                    try:
-                        result      = core_db.process_file_data(data=data, file_name=name)
-                        core_s3.delete_files(file_path=path)
-                        step_finish = round(time.time() - step_start, 2)
-                        account_id  = core_db.curr_acct['account_id'] if core_db.curr_acct else 'Unknown'
-                        print(f"\r{SUCCESS} {account_id}/{REGION}/{name} Data Loaded & File moved to loaded/ folder in {step_finish}s")
-                        
-                    except Exception as e:
-                        print(f"\r{FAIL} Error loading file {name}: {str(e)}")        
-                        continue
-                except Exception as e:
-                    print(f"\r{FAIL} Error reading file {name}: {str(e)}")
-                    continue
-            load_time_finish            = round(time.time() - load_time_start, 2)
-            result['load_time_finish']  = load_time_finish
-            return result
-        else:
+        # Event invocations leave partitions to the sweeps and retention mode, see ensure_partitions
+        if files is None:
+            try:
+                result.update(ensure_partitions(db_backend))
+            except Exception as e:
+                print(f"{FAIL} Partition check failed: {e}")
+
+        print(f"{INFO} Starting to Load dataset(s) with {FILE_WORKERS} worker(s)")
+
+        def collect(future, file):
+            try:
+                merge_stats(result, future.result())
+            except Exception as e:
+                print(f"{FAIL} Error loading file {file['file_name']}: {str(e)}")
+
+        def run(file, future):
+            try:
+                future.set_result(load_file(core_s3, db_backend, file, archiver))
+            except Exception as e:
+                future.set_exception(e)
+
+        #1. load data, each file in its own worker with its own CoreManager
+        with ThreadPoolExecutor(max_workers=FILE_WORKERS) as executor:
+            futures = {}
+            last    = {}
+            for file in (files if files is not None else core_s3.iter_files(prefix="data/")):
+                # Bounded look-ahead so the listing never runs far ahead of loading
+                if len(futures) >= FILE_WORKERS * 2:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(future, futures.pop(future))
+
+                # Files of one account/region load one after another, oldest first. The next one is
+                # submitted from the previous one's done-callback, so no worker is held waiting for it
+                shard       = file['file_path'].rsplit('/', 1)[0]
+                future      = Future()
+                LoadScheduler.when_done([last[shard]] if shard in last else [], lambda file=file, future=future: executor.submit(run, file, future))
+
+                futures[future] = file
+                last[shard]     = future
+                file_count     += 1
+
+            for future in as_completed(futures):
+                collect(future, futures[future])
+
+        if file_count == 0:
             raise Exception("No files to load")
+
+        print(f"{INFO} Loaded {file_count} dataset(s)")
+        load_time_finish            = round(time.time() - load_time_start, 2)
+        result['load_time_finish']  = load_time_finish
+
+        # Views are refreshed once per run, after every file, and timed separately from the load
+        result.update(refresh_views(db_backend, result))
+        return result
         
     except Exception as e:
         print(e)
         return result
 
+    finally:
+        # Archive stats are reported separately from the load time
+        if file_count:
+            result.update(archiver.flush())
+        else:
+            archiver.flush()
+
+""" 6. RETENTION : Prunes expired rows and loaded/ files, run with {"mode": "retention"} outside the load window """
+def retention_policies() -> Dict[str, int]:
+    """Days kept per table, RETENTION_DAYS overridden by the RECEIVER_RETENTION JSON object"""
+    policies = dict(RETENTION_DAYS)
+    if not RETENTION_OVERRIDE:
+        return policies
+    try:
+        for table, days in json.loads(RETENTION_OVERRIDE).items():
+            if table in RETENTION_COLUMNS:
+                policies[table] = int(days or 0)
+            else:
+                print(f"{FAIL} No retention policy possible for {table}, ignored")
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"{FAIL} Invalid RECEIVER_RETENTION, using the defaults: {e}")
+    return policies
+
+def retention_cutoff(table: str, days: Optional[int]) -> Optional[date]:
+    """First date kept for table, None when it is kept forever.
+    Tables rolled up per month only expire whole months, so a month is never summarized half deleted."""
+    if not days:
+        return None
+    cutoff = date.today() - timedelta(days=days)
+    if RETENTION_ROLLUP and table in RETENTION_ROLLUPS:
+        cutoff = cutoff.replace(day=1)
+    return cutoff
+
+def run_retention() -> Dict:
+    """Apply the retention policies: roll up expiring detail, drop expired partitions whole,
+    delete the remaining expired rows in batches and remove loaded/ files past ARCHIVE_RETENTION_DAYS"""
+    retention_start = time.time()
+    db_backend      = database_backend(boto3.client('rds-data', region_name=REGION))
+    db              = DBManager(database_name=DB_NAME or '', cluster_arn=ARN_AURORA, secret_arn=ARN_SECRET, backend=db_backend)
+    policies        = retention_policies()
+    result          = {'RETENTION_ROWS': 0, 'RETENTION_BYTES': 0, 'retention': {}}
+
+    partitions = {}
+    for row in db.select(PARTITIONS_SQL):
+        if row['partition_name']:
+            partitions.setdefault(row['parent_name'], []).append(row['partition_name'])
+
+    for table, column in RETENTION_COLUMNS.items():
+        cutoff = retention_cutoff(table, policies.get(table))
+        if cutoff is None:
+            continue
+
+        stats = {'cutoff': str(cutoff), 'rows': 0, 'bytes': 0, 'partitions': 0, 'rolled_up': 0}
+        try:
+            if RETENTION_ROLLUP and table in RETENTION_ROLLUPS:
+                # Nothing is deleted unless its summary was written
+                stats['rolled_up'] = db.execute_statement(RETENTION_ROLLUPS[table], {'cutoff': str(cutoff)}, long_running=True).get('numberOfRecordsUpdated', 0)
+
+            for partition in sorted(partitions.get(table, [])):
+                month = re.fullmatch(rf"{table}_(\d{{4}})_(\d{{2}})", partition)
+                if not month or add_months(date(int(month[1]), int(month[2]), 1), 1) > cutoff:
+                    continue
+                dropped             = db.drop_partition(partition)
+                stats['rows']       += dropped['rows']
+                stats['bytes']      += dropped['bytes']
+                stats['partitions'] += 1
+
+            deleted         = db.delete_expired(table, column, cutoff)
+            stats['rows']   += deleted['rows']
+            stats['bytes']  += deleted['bytes']
+        except Exception as e:
+            print(f"{FAIL} Retention of {table} stopped: {e}")
+
+        result['retention'][table]  = stats
+        result['RETENTION_ROWS']    += stats['rows']
+        result['RETENTION_BYTES']   += stats['bytes']
+
+    # Weekly retention runs keep PARTITION_MONTHS_AHEAD covered for Lambda deployments without a sweep
+    try:
+        result.update(ensure_partitions(db_backend))
+    except Exception as e:
+        print(f"{FAIL} Partition check failed: {e}")
+
+    if ARCHIVE_RETENTION_DAYS:
+        archive = S3Manager(BUCKET or '').delete_older_than('loaded/', datetime.now(timezone.utc) - timedelta(days=ARCHIVE_RETENTION_DAYS))
+        result.update({'ARCHIVE_PRUNED': archive['deleted'], 'ARCHIVE_PRUNED_BYTES': archive['bytes'], 'ARCHIVE_PRUNE_FAILED': archive['failed']})
+
+    result['retention_time_finish'] = round(time.time() - retention_start, 2)
+    return result
+
+def process_retention(status: Dict) -> List[str]:
+    """One summary line per pruned table and for loaded/"""
+    lines = []
+    for table, stats in status.get('retention', {}).items():
+        line = f"{SUCCESS} {table}: {stats['rows']} rows before {stats['cutoff']}, {round(stats['bytes'] / 1048576, 2)} MB reclaimed"
+        if stats['partitions']:
+            line += f", {stats['partitions']} partition(s) dropped"
+        if stats['rolled_up']:
+            line += f", {stats['rolled_up']} monthly rollup row(s) written"
+        lines.append(line)
+    if 'ARCHIVE_PRUNED' in status:
+        lines.append(f"{SUCCESS} loaded/: {status['ARCHIVE_PRUNED']} file(s), {round(status['ARCHIVE_PRUNED_BYTES'] / 1048576, 2)} MB removed, {status['ARCHIVE_PRUNE_FAILED']} failed")
+    if status.get('PARTITIONS_CREATED'):
+        lines.append(f"{INFO} Partitions: {status['PARTITIONS_CREATED']} monthly partition(s) created")
+    lines.append(f"{TIMING}  Reclaimed: {status['RETENTION_ROWS']} rows, {round(status['RETENTION_BYTES'] / 1048576, 2)} MB in {status['retention_time_finish']} seconds")
+    return lines
+
 """ 7. Testing Function, Used to test the script without fetching data from S3 instead uses the sample.json  """
 
 def testing():
@@ -1561,8 +3943,19 @@ def lambda_handler(event=None, context=None):
         
         if context is not None and context == "test":
             data    = testing()
+        elif isinstance(event, dict) and event.get('mode') == 'retention':
+            # Scheduled separately from the loads, see run_retention
+            print("*"*15, "Retention", "*"*15)
+            for line in process_retention(run_retention()):
+                print(line)
+            print("*"*15,"Disconnected","*"*15)
+            return True
         else:
-            data    = load_data()
+            # Event mode loads only the notified keys; schedules and manual runs sweep data/
+            files   = event_files(event)
+            if files is not None:
+                print(f"{INFO} Event mode: {len(files)} file(s) from the notification")
+            data    = load_data(files)
 
         if not data:
             print(f"{INFO} No files to load")
@@ -1578,6 +3971,23 @@ def lambda_handler(event=None, context=None):
         print(status[2])
         if 'load_time_finish' in data:
             print(f"{TIMING}  Time Taken: {data['load_time_finish']} seconds")
+        for kind in ('sections', 'tables'):
+            if data.get(kind):
+                print("*"*15, f"By {kind[:-1].title()}", "*"*15)
+                for line in process_load_breakdown(data, kind):
+                    print(line)
+        if data.get('UNCHANGED'):
+            print(f"{INFO} Unchanged: {data['UNCHANGED']} file(s) archived without loading")
+        if data.get('ARCHIVED') or data.get('ARCHIVE_FAILED'):
+            archive_time = data.get('archive_time_finish') or 0
+            throughput   = round(data['ARCHIVED'] / archive_time, 1) if archive_time else data['ARCHIVED']
+            print(f"{TIMING}  Archived: {data['ARCHIVED']} file(s) to loaded/ in {archive_time} seconds ({throughput} files/s), {data['ARCHIVE_FAILED']} failed")
+        if data.get('PARTITIONS_CREATED'):
+            print(f"{INFO} Partitions: {data['PARTITIONS_CREATED']} monthly partition(s) created")
+        if 'VIEWS_REFRESHED' in data:
+            print(f"{TIMING}  Refreshed: {data['VIEWS_REFRESHED']} materialized view(s) in {data['refresh_time_finish']} seconds, {data['VIEWS_SKIPPED']} already refreshing elsewhere")
+        print(f"{INFO} SQL Templates: {STATEMENT_CACHE_STATS['hits']} cached, {STATEMENT_CACHE_STATS['misses']} built in {round(STATEMENT_CACHE_STATS['build_time'], 3)}s")
+        print(f"{INFO} Dimension Cache: {DIMENSIONS.stats['hits']} hits, {DIMENSIONS.stats['misses']} misses, {DIMENSIONS.stats['loads']} load(s)")
         print("*"*15,"Disconnected","*"*15)
         return True
     else:
@@ -10,6 +10,8 @@ import os
 import calendar
 import time
 import random
+import gzip
+import hashlib
 
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Union, Any
@@ -22,6 +24,11 @@ from enum import Enum
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+try:
+    import zstandard    # Optional: not in the Lambda runtime, payloads fall back to gzip without it
+except ImportError:
+    zstandard = None
+
 
 """ GLOBAL VARIABLES """
 REGION      = os.environ.get("REGION", "us-east-1") #boto3.client('sts').meta.region_name
@@ -33,6 +40,10 @@ CATEGORY    = os.environ.get("CATEGORY", None)
 ENVIRONMENT = os.environ.get("ENVIRONMENT", None)
 PRODUCT     = os.environ.get("PRODUCT", None)
 
+PAYLOAD_FORMAT  = os.environ.get("PAYLOAD_FORMAT", "json.gz")   # json | ndjson, optionally .gz / .zst
+PAYLOAD_VERSION = "2"
+PAYLOAD_ENCODINGS = {'gz': 'gzip', 'zst': 'zstd', '': 'identity'}
+
 SUCCESS     = "🟢"  
 FAIL        = "🟡"  
 ERROR       = "🔴"  
@@ -47,12 +58,61 @@ class DateTimeEncoder(json.JSONEncoder):
             return o.isoformat()
         return super().default(o)
 
+def section_hash(value: Any) -> str:
+    """Short, key-order independent hash of one section, matched by the receiver's ingestion ledger"""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), cls=DateTimeEncoder)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+def encode_payload(data: Dict, payload_format: str = PAYLOAD_FORMAT):
+    """Serialize data in the versioned wire format. Returns (body, key suffix, S3 metadata).
+    json: one compact object. ndjson: a manifest line with record counts per section, then one
+    line per list record ({"section", "record"}) or per other section ({"section", "value"})."""
+    layout, _, encoding = payload_format.lower().partition('.')
+    layout      = layout if layout in ('json', 'ndjson') else 'json'
+    encoding    = encoding if encoding in PAYLOAD_ENCODINGS else 'gz'
+    if encoding == 'zst' and zstandard is None:
+        print(f"{FAIL} zstandard is not installed, compressing with gzip")
+        encoding = 'gz'
+
+    dumps       = lambda value: json.dumps(value, separators=(',', ':'), cls=DateTimeEncoder)
+    manifest    = {section: len(value) if isinstance(value, list) else 1 for section, value in data.items()}
+    hashes      = {section: section_hash(value) for section, value in data.items()}
+
+    if layout == 'ndjson':
+        lines = [dumps({'payload_version': PAYLOAD_VERSION, 'sections': manifest})]
+        for section, value in data.items():
+            if isinstance(value, list):
+                lines.extend(dumps({'section': section, 'record': record}) for record in value)
+            else:
+                lines.append(dumps({'section': section, 'value': value}))
+        raw = ('\n'.join(lines) + '\n').encode('utf-8')
+    else:
+        raw = dumps(data).encode('utf-8')
+
+    if encoding == 'gz':
+        body = gzip.compress(raw, compresslevel=6)
+    elif encoding == 'zst':
+        body = zstandard.ZstdCompressor(level=3).compress(raw)
+    else:
+        body = raw
+
+    metadata = {
+        'payload-version'   : PAYLOAD_VERSION,
+        'payload-format'    : layout,
+        'payload-encoding'  : PAYLOAD_ENCODINGS[encoding],
+        'payload-bytes'     : str(len(raw)),
+        'payload-manifest'  : dumps(manifest),
+        'payload-sha256'    : hashlib.sha256(raw).hexdigest(),
+        'payload-sections'  : dumps(hashes)
+    }
+    suffix = f".{layout}.{encoding}" if encoding else f".{layout}"
+    return body, suffix, metadata
+
 def upload_to_s3(account, data, interval, end_date):
 
     end_date    = datetime.now(timezone.utc) if not end_date else end_date
     s3          = boto3.client('s3')
     timestamp   = end_date.strftime("%H%M%S")
-    filename    = f'data/{account}/{REGION}/{end_date.year}-{end_date.month:02d}-{end_date.day:02d}_{interval}.json'
     
     try:
         # Check if data is None and handle it
@@ -60,15 +120,16 @@ def upload_to_s3(account, data, interval, end_date):
             print("Warning: Data is None, creating empty JSON object")
             data = {"warning": "No data collected", "timestamp": datetime.now(timezone.utc).isoformat()}
         
-        # Convert data to JSON string with datetime handling
-        json_data = json.dumps(data, indent=4, cls=DateTimeEncoder)
+        # Compact, compressed payload with a manifest of record counts per section
+        body, suffix, metadata = encode_payload(data)
+        filename    = f'data/{account}/{REGION}/{end_date.year}-{end_date.month:02d}-{end_date.day:02d}_{interval}{suffix}'
         
         # Calculate file size
-        file_size_bytes = len(json_data.encode('utf-8'))
+        file_size_bytes = len(body)
         file_size_mb = round(file_size_bytes / (1024 * 1024), 2)
 
         # Upload to S3 with KMS encryption
-        put_params = {'Bucket': BUCKET, 'Key': filename, 'Body': json_data}
+        put_params = {'Bucket': BUCKET, 'Key': filename, 'Body': body, 'Metadata': metadata}
 
         if KMS_KEY_ID:
             put_params['ServerSideEncryption'] = 'aws:kms'
@@ -58,8 +58,9 @@ CREATE TABLE alternate_contacts (
 
 /* Services Table Schema */
 -- Create the services table
+-- Partitioned by month on date_from; the receiver creates the monthly partitions, other rows go to the default one
 CREATE TABLE services (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
     service VARCHAR(255) NOT NULL,
     date_from DATE NOT NULL,
@@ -72,7 +73,39 @@ CREATE TABLE services (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT date_check CHECK (date_to >= date_from),
+    PRIMARY KEY (id, date_from),
     UNIQUE (account_id, service, usage_types, date_from)
+) PARTITION BY RANGE (date_from);
+
+CREATE TABLE services_default PARTITION OF services DEFAULT;
+
+-- Service cost rollups per account, service and day / month, kept up to date by the receiver for the periods it loads.
+-- service_cost_monthly also keeps the months whose services rows expired (receiver retention mode)
+CREATE TABLE service_cost_daily (
+    id SERIAL PRIMARY KEY,
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    service VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    cost DECIMAL(20,10) NOT NULL,
+    currency VARCHAR(3) DEFAULT 'USD',
+    line_items INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (account_id, service, day)
+);
+
+CREATE TABLE service_cost_monthly (
+    id SERIAL PRIMARY KEY,
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    service VARCHAR(255) NOT NULL,
+    month DATE NOT NULL,
+    cost DECIMAL(20,10) NOT NULL,
+    currency VARCHAR(3) DEFAULT 'USD',
+    usage_days INTEGER NOT NULL DEFAULT 0,
+    line_items INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (account_id, service, month)
 );
 
 
@@ -216,13 +249,17 @@ CREATE TABLE logs (
 );
 
 -- Create the log_messages table for storing messages
+-- Partitioned by month on created_at; the receiver creates the monthly partitions, other rows go to the default one
 CREATE TABLE log_messages (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     log_id INTEGER NOT NULL REFERENCES logs(id) ON DELETE CASCADE,
     message TEXT NOT NULL,
     message_type TEXT,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE log_messages_default PARTITION OF log_messages DEFAULT;
 
 /* NEW TABLES FOR EXPANDED DATA - ADD TO EXISTING SCHEMA */
 -- Config compliance reports
@@ -241,19 +278,23 @@ CREATE TABLE config_reports (
     UNIQUE (account_id, date_from)
 );
 
+-- Partitioned by month on created_at; the receiver creates the monthly partitions, other rows go to the default one
 CREATE TABLE non_compliant_resources (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     config_report_id INTEGER REFERENCES config_reports(id) ON DELETE CASCADE,
     resource_type VARCHAR(255),
     resource_id VARCHAR(255),
     compliance_type VARCHAR(50),
     rule_name VARCHAR(255),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     annotation TEXT,
     evaluation_mode TEXT,
     conformance_pack TEXT,
-    status VARCHAR(255) NOT NULL DEFAULT 'OPEN'
-);
+    status VARCHAR(255) NOT NULL DEFAULT 'OPEN',
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE non_compliant_resources_default PARTITION OF non_compliant_resources DEFAULT;
 
 -- Create new service_resources table
 CREATE TABLE service_resources (
@@ -280,6 +321,7 @@ CREATE TABLE service_resources (
     min_size INTEGER,
     max_size INTEGER,
     available_ip_count INTEGER,
+    row_fingerprint VARCHAR(32),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -395,6 +437,7 @@ CREATE TABLE kms_keys (
     creation_date TIMESTAMP WITH TIME ZONE,
     enabled BOOLEAN DEFAULT TRUE,
     key_rotation_enabled BOOLEAN DEFAULT FALSE,
+    row_fingerprint VARCHAR(32),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -451,6 +494,7 @@ CREATE TABLE cloudtrail_logs (
     kms_key_id VARCHAR(255),
     log_file_validation BOOLEAN DEFAULT FALSE,
     latest_delivery_time TIMESTAMP WITH TIME ZONE,
+    row_fingerprint VARCHAR(32),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     UNIQUE (arn)
 );
@@ -464,6 +508,7 @@ CREATE TABLE secrets_manager_secrets (
     created_date TIMESTAMP WITH TIME ZONE,
     last_changed_date TIMESTAMP WITH TIME ZONE,
     rotation_enabled BOOLEAN DEFAULT FALSE,
+    row_fingerprint VARCHAR(32),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     UNIQUE (arn)
 );
@@ -476,6 +521,7 @@ CREATE TABLE certificates (
     status VARCHAR(50),
     type VARCHAR(50),
     not_after TIMESTAMP WITH TIME ZONE,
+    row_fingerprint VARCHAR(32),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     UNIQUE (arn)
 );
@@ -639,8 +685,9 @@ CREATE TABLE support_tickets (
     CONSTRAINT date_check CHECK (date_to >= date_from)
 );
 
+-- Partitioned by month on date_to; the receiver creates the monthly partitions, other rows go to the default one
 CREATE TABLE ri_sp_daily_savings (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
     date_from DATE NOT NULL,
     date_to DATE NOT NULL,
@@ -675,8 +722,23 @@ CREATE TABLE ri_sp_daily_savings (
     description TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date_to),
     CONSTRAINT ri_sp_daily_savings_unique 
     UNIQUE (account_id, subscription_id, date_to, reservation_type)
+) PARTITION BY RANGE (date_to);
+
+CREATE TABLE ri_sp_daily_savings_default PARTITION OF ri_sp_daily_savings DEFAULT;
+
+-- Ingestion ledger: one row per spoke file (key without its format suffix), used by receiver.py to skip unchanged files and sections
+CREATE TABLE ingestion_ledger (
+    id SERIAL PRIMARY KEY,
+    s3_key VARCHAR(1024) NOT NULL,
+    content_hash VARCHAR(128) NOT NULL,
+    payload_version VARCHAR(10) NOT NULL,
+    section_hashes JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (s3_key)
 );
 
 /* Set Indexes */
@@ -691,6 +753,8 @@ CREATE INDEX idx_alternate_contacts_account_id ON alternate_contacts(account_id)
 CREATE INDEX idx_services_account_id ON services(account_id);
 CREATE INDEX idx_services_service ON services(service);
 CREATE INDEX idx_services_date_range ON services(date_from, date_to);
+CREATE INDEX idx_service_cost_daily_account_day ON service_cost_daily(account_id, day);
+CREATE INDEX idx_service_cost_monthly_account_month ON service_cost_monthly(account_id, month);
 
 
 -- Cost - Create indexes for better performance
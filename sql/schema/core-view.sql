@@ -861,7 +861,8 @@ FROM
     LEFT JOIN products p ON pa.product_id = p.id;
 
 --36. Summary view with product count only
-CREATE OR REPLACE VIEW view_summary AS
+-- Materialized in mv_summary, refreshed by the receiver after each load run that changed its source tables
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_summary AS
 SELECT
     -- Account Identifiers
     a.id as account_id,
@@ -910,8 +911,7 @@ SELECT
     -- Account Information
     a.account_email,
     a.joined_method,
-    a.joined_timestamp,
-    EXTRACT(DAY FROM AGE(CURRENT_TIMESTAMP, a.joined_timestamp)) as account_age_days
+    a.joined_timestamp
 FROM accounts a
 LEFT JOIN (
     SELECT DISTINCT ON (account_id, period_granularity)
@@ -924,11 +924,11 @@ LEFT JOIN (
 LEFT JOIN (
     SELECT
         account_id,
-        COUNT(DISTINCT id) as service_count,
+        SUM(line_items) as service_count,
         COUNT(DISTINCT service) as unique_services,
         SUM(cost) as total_service_cost,
         STRING_AGG(DISTINCT service, ', ') as services_used
-    FROM services
+    FROM service_cost_monthly
     GROUP BY account_id
 ) sm ON sm.account_id = a.id
 LEFT JOIN (
@@ -953,13 +953,22 @@ LEFT JOIN (
 ) pc ON pc.account_id = a.id
 WHERE
     (cr.period_granularity IS NULL OR
-     cr.period_granularity::text IN ('MONTHLY', 'WEEKLY', 'DAILY'))
+     cr.period_granularity::text IN ('MONTHLY', 'WEEKLY', 'DAILY'));
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_summary_unique ON mv_summary (account_id, period_granularity) NULLS NOT DISTINCT;
+
+CREATE OR REPLACE VIEW view_summary AS
+SELECT
+    mv.*,
+    EXTRACT(DAY FROM AGE(CURRENT_TIMESTAMP, mv.joined_timestamp)) as account_age_days
+FROM mv_summary mv
 ORDER BY
-    a.account_name,
-    cr.period_start DESC;
+    mv.account_name,
+    mv.date_from DESC;
 
 --37. Account summary view (CORRECTED - single version)
-CREATE OR REPLACE VIEW view_acct_summary AS
+-- Materialized in mv_acct_summary, refreshed by the receiver after each load run that changed its source tables
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_acct_summary AS
 SELECT
     a.*,
     a.account_id as account,
@@ -1019,8 +1028,14 @@ FROM
         GROUP BY account_id
     ) i ON i.account_id = a.id;
 
+CREATE UNIQUE INDEX IF NOT EXISTS mv_acct_summary_unique ON mv_acct_summary (id);
+
+CREATE OR REPLACE VIEW view_acct_summary AS
+SELECT * FROM mv_acct_summary;
+
 --38. Product summary view with individual products
-CREATE OR REPLACE VIEW view_product_summary AS
+-- Materialized in mv_product_summary, refreshed by the receiver after each load run that changed its source tables
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_product_summary AS
 SELECT
     -- Account Identifiers
     a.id as account_id,
@@ -1074,8 +1089,7 @@ SELECT
     -- Account Information
     a.account_email,
     a.joined_method,
-    a.joined_timestamp,
-    EXTRACT(DAY FROM AGE(CURRENT_TIMESTAMP, a.joined_timestamp)) as account_age_days
+    a.joined_timestamp
 FROM accounts a
 LEFT JOIN product_accounts pa ON a.id = pa.account_id
 LEFT JOIN products p ON pa.product_id = p.id
@@ -1090,11 +1104,11 @@ LEFT JOIN (
 LEFT JOIN (
     SELECT
         account_id,
-        COUNT(DISTINCT id) as service_count,
+        SUM(line_items) as service_count,
         COUNT(DISTINCT service) as unique_services,
         SUM(cost) as total_service_cost,
         STRING_AGG(DISTINCT service, ', ') as services_used
-    FROM services
+    FROM service_cost_monthly
     GROUP BY account_id
 ) sm ON sm.account_id = a.id
 LEFT JOIN (
@@ -1112,14 +1126,23 @@ LEFT JOIN (
 ) sec ON sec.account_id = a.id
 WHERE
     (cr.period_granularity IS NULL OR
-     cr.period_granularity::text IN ('MONTHLY', 'WEEKLY', 'DAILY'))
+     cr.period_granularity::text IN ('MONTHLY', 'WEEKLY', 'DAILY'));
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_product_summary_unique ON mv_product_summary (account_id, product_id, period_granularity) NULLS NOT DISTINCT;
+
+CREATE OR REPLACE VIEW view_product_summary AS
+SELECT
+    mv.*,
+    EXTRACT(DAY FROM AGE(CURRENT_TIMESTAMP, mv.joined_timestamp)) as account_age_days
+FROM mv_product_summary mv
 ORDER BY
-    a.account_name,
-    p.name,
-    cr.period_start DESC;
+    mv.account_name,
+    mv.project_product_name,
+    mv.date_from DESC;
 
 --39. Security findings summary view
-CREATE OR REPLACE VIEW view_acct_security_findings_summary AS
+-- Materialized in mv_acct_security_findings_summary, refreshed by the receiver after each load run that changed its source tables
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_acct_security_findings_summary AS
 SELECT
     a.account_id as account,
     a.region as account_region,
@@ -1164,7 +1187,8 @@ SELECT
         ELSE 'Clean'
     END as risk_level,
     s.created_at,
-    s.updated_at
+    s.updated_at,
+    s.id as security_id
 FROM
     security s
     JOIN accounts a ON s.account_id = a.id
@@ -1175,6 +1199,11 @@ FROM
     ) pa ON a.id = pa.account_id
     LEFT JOIN products p ON pa.product_id = p.id;
 
+CREATE UNIQUE INDEX IF NOT EXISTS mv_acct_security_findings_summary_unique ON mv_acct_security_findings_summary (security_id);
+
+CREATE OR REPLACE VIEW view_acct_security_findings_summary AS
+SELECT * FROM mv_acct_security_findings_summary;
+
 --40. Compute Optimizer View
 CREATE OR REPLACE VIEW view_compute_optimizer_summary AS
 SELECT
@@ -1252,4 +1281,54 @@ FROM
         FROM product_accounts
         ORDER BY account_id, id
     ) pa ON a.id = pa.account_id
-    LEFT JOIN products p ON pa.product_id = p.id;
\ No newline at end of file
+    LEFT JOIN products p ON pa.product_id = p.id;
+
+--43. Daily service cost rollup view
+-- Reads service_cost_daily, which the receiver keeps up to date for the days it loads, instead of aggregating services
+CREATE OR REPLACE VIEW view_acct_serv_cost_daily AS
+SELECT
+    d.*,
+    a.account_id as account,
+    a.region as account_region,
+    a.account_name,
+    a.account_type,
+    a.category as account_category,
+    a.account_status as account_status,
+    a.partner_name as account_partner,
+    a.customer_name as account_customer,
+    CONCAT(a.account_id, '-', a.account_name) as account_full,
+    p.name as project_product_name
+FROM
+    service_cost_daily d
+    JOIN accounts a ON d.account_id = a.id
+    LEFT JOIN (
+        SELECT DISTINCT ON (account_id) account_id, product_id
+        FROM product_accounts
+        ORDER BY account_id, id
+    ) pa ON a.id = pa.account_id
+    LEFT JOIN products p ON pa.product_id = p.id;
+
+--44. Monthly service cost rollup view
+-- Reads service_cost_monthly, which also keeps the months whose services rows expired
+CREATE OR REPLACE VIEW view_acct_serv_cost_monthly AS
+SELECT
+    m.*,
+    a.account_id as account,
+    a.region as account_region,
+    a.account_name,
+    a.account_type,
+    a.category as account_category,
+    a.account_status as account_status,
+    a.partner_name as account_partner,
+    a.customer_name as account_customer,
+    CONCAT(a.account_id, '-', a.account_name) as account_full,
+    p.name as project_product_name
+FROM
+    service_cost_monthly m
+    JOIN accounts a ON m.account_id = a.id
+    LEFT JOIN (
+        SELECT DISTINCT ON (account_id) account_id, product_id
+        FROM product_accounts
+        ORDER BY account_id, id
+    ) pa ON a.id = pa.account_id
+    LEFT JOIN products p ON pa.product_id = p.id;